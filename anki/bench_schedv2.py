@@ -0,0 +1,192 @@
+"""
+Micro-benchmarks of schedv2.py.
+
+    $ python3 bench_schedv2.py
+"""
+import copy
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from schedv2 import STARTING_FACTOR, REV_CARDS_DUE, REV_CARDS_OVERDUE
+from generate import generateCollection, REVIEW
+from journal import AnswerLog
+from profiling import Profiler
+import snapshot
+
+
+def reviewCollection(size, seed=0):
+    "Returns a collection of SIZE review cards due today."
+    return generateCollection(size, seed, states={REVIEW: 1},
+                              ivl=lambda rng: rng.randint(1, 100),
+                              factor=lambda rng: STARTING_FACTOR,
+                              lapses=lambda rng: 0,
+                              due=lambda rng, ivl: -rng.randint(0, 10))
+
+
+def randomAnswers(col, seed=0):
+    """Returns a (card, ease, timestamp) answer for each card of COL."""
+    rng = random.Random(seed)
+    now = time.time()
+    return [(card, rng.choice([1, 2, 3, 3, 3, 4]), now) for card in col.cards]
+
+
+def benchAnswerCards(size=20000, repeat=5):
+    "Compare answerCard() in a loop with a single call to answerCards()."
+    single, batch = [], []
+    for i in range(repeat):
+        col = reviewCollection(size, seed=i)
+        answers = randomAnswers(col, seed=i)
+        start = time.perf_counter()
+        for card, ease, timestamp in answers:
+            col.sched.answerCard(card, ease)
+        col.sched.reset()
+        single.append(time.perf_counter() - start)
+
+        col = reviewCollection(size, seed=i)
+        answers = randomAnswers(col, seed=i)
+        start = time.perf_counter()
+        col.sched.answerCards(answers)
+        batch.append(time.perf_counter() - start)
+
+    print(f"answerCard()  x {size}: {size / min(single):>10.0f} answers/s")
+    print(f"answerCards() x {size}: {size / min(batch):>10.0f} answers/s")
+
+
+def benchAnswerLog(size=20000):
+    "Measure the overhead of the write-ahead log per answer."
+    col = reviewCollection(size)
+    answers = randomAnswers(col)
+    start = time.perf_counter()
+    for card, ease, timestamp in answers:
+        col.sched.answerCard(card, ease)
+    unlogged = time.perf_counter() - start
+
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        col = reviewCollection(size)
+        answers = randomAnswers(col)
+        col.sched.log = AnswerLog(path)
+        start = time.perf_counter()
+        for card, ease, timestamp in answers:
+            col.sched.answerCard(card, ease)
+        col.sched.log.close()
+        logged = time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+    overhead = (logged - unlogged) / size * 1e6
+    print(f"AnswerLog overhead: {overhead:.1f} us/answer")
+
+
+def benchSnapshot(size=100000):
+    "Measure the time to save and restore a collection."
+    col = reviewCollection(size)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        snapshot.save(col, path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        snapshot.load(path)
+        loaded = time.perf_counter() - start
+        print(f"snapshot x {size}: save {saved*1000:.0f} ms, "
+              f"load {loaded*1000:.0f} ms ({os.path.getsize(path) // 1024} KiB)")
+    finally:
+        os.remove(path)
+
+
+def benchProfiler(size=20000):
+    "Measure the overhead of the profiler per answer."
+    timings = []
+    for profiled in (False, True):
+        col = reviewCollection(size)
+        answers = randomAnswers(col)
+        profiler = Profiler()
+        if profiled:
+            profiler.attach(col.sched)
+        start = time.perf_counter()
+        for card, ease, timestamp in answers:
+            col.sched.answerCard(card, ease)
+        timings.append(time.perf_counter() - start)
+    overhead = (timings[1] - timings[0]) / size * 1e6
+    print(f"Profiler overhead: {overhead:.1f} us/answer")
+
+
+def benchReviewBacklog(size=100000, refills=20):
+    "Measure the refills of the review queue after a month away."
+    col = generateCollection(size, states={REVIEW: 1},
+                             due=lambda rng, ivl: -rng.randint(1, 30))
+    sched = col.sched
+    lim = min(sched.queueLimit, col.deckConf["rev"]["perDay"])
+    start = time.perf_counter()
+    for i in range(refills):
+        # the previous implementation, sorting the whole backlog
+        cards = [card for card in col.cards if card.queue == 2 and card.due <= sched.today]
+        cards.sort(key=lambda card: card.due)
+        cards = cards[:lim]
+    sorting = (time.perf_counter() - start) / refills
+    print(f"review backlog x {size}: full sort {sorting*1000:.1f} ms/refill")
+
+    for name, order in [("due", REV_CARDS_DUE), ("overdue", REV_CARDS_OVERDUE)]:
+        col.deckConf = copy.deepcopy(col.deckConf)
+        col.deckConf["rev"]["order"] = order
+        start = time.perf_counter()
+        for i in range(refills):
+            sched._revQueue = []
+            sched._fillRev()
+        elapsed = (time.perf_counter() - start) / refills
+        print(f"review backlog x {size}: top-k by {name:<7} {elapsed*1000:.1f} ms/refill")
+
+
+def benchLoadBalance(size=10000, days=120):
+    "Compare the daily reviews with the random fuzz and the load-balanced fuzz."
+    for balanced in (False, True):
+        col = reviewCollection(size)
+        col.deckConf = copy.deepcopy(col.deckConf)
+        col.deckConf["rev"]["loadBalance"] = balanced
+        sched = col.sched
+        rng = random.Random(0)
+        now = time.time()
+        daily = []
+        elapsed = 0
+        for day in range(days):
+            due = [card for card in col.cards if card.queue == 2 and card.due <= sched.today + day]
+            daily.append(len(due))
+            # no lapse, to keep all the cards in review
+            answers = [(card, rng.choice([2, 3, 3, 3, 4]), now + day * 86400) for card in due]
+            start = time.perf_counter()
+            sched.answerCards(answers)
+            elapsed += time.perf_counter() - start
+        perAnswer = elapsed / sum(daily) * 1e6
+        # ignore the initial backlog
+        daily = daily[days // 4:]
+        print(f"loadBalance={balanced!s:<5}: peak {max(daily)} reviews/day, "
+              f"stdev {statistics.pstdev(daily):.1f}, {perAnswer:.1f} us/answer")
+
+
+def benchChangeDeckConf(size=1000000):
+    "Measure the reschedule of a collection after a change of the intervals."
+    col = generateCollection(size)
+    deckConf = copy.deepcopy(col.deckConf)
+    deckConf["rev"]["ivlFct"] = 0.8
+    deckConf["rev"]["maxIvl"] = 3650
+    deckConf["lapse"]["minInt"] = 2
+    start = time.perf_counter()
+    changed = col.sched.changeDeckConf(deckConf)
+    elapsed = time.perf_counter() - start
+    print(f"changeDeckConf() x {size}: {elapsed:.2f}s ({changed} cards rescheduled)")
+
+
+if __name__ == "__main__":
+    benchAnswerCards()
+    benchAnswerLog()
+    benchSnapshot()
+    benchProfiler()
+    benchReviewBacklog()
+    benchLoadBalance()
+    benchChangeDeckConf()
@@ -0,0 +1,243 @@
+"""
+Differential testing of the scheduler variants.
+
+schedv2.py, schedv2_annotated.py and schedv2_minimal_v*.py are copies of
+the same scheduler and must agree where their features overlap. The same
+random stream of answers is applied to a collection of each variant, on a
+virtual clock, and the answered card is compared after each step with the
+same card of a reference variant:
+
+    $ python3 differential.py 100000 42   # 100000 steps with the seed 42
+
+A faster implementation is checked by adding it as a candidate:
+
+    run(100000, variants=VARIANTS + [Variant("fast", fastsched, reference="schedv2")])
+
+The fields that differ by design are not compared: schedv2_minimal_v2.py has
+a single learning queue (no day learning queue, no fuzz of the learning
+delays), and schedv2_minimal_v3.py has no fuzz of the intervals.
+
+The copies of the scheduler draw their fuzz from the random module, while
+schedv2.py hashes it from the answered card (see CardRandom). The random
+module of the copies is replaced to return the same numbers as schedv2.py.
+Their queues are shuffled differently: the order of getCard() is compared
+with a schedv2.py scheduler shuffling its queues like the copies (see
+RandomShuffleScheduler).
+"""
+import random
+import sys
+import time
+
+import schedv2
+import schedv2_annotated
+import schedv2_minimal_v1
+import schedv2_minimal_v2
+import schedv2_minimal_v3
+from virtualclock import VirtualClock
+
+# The compared attributes of the cards
+FIELDS = ("type", "queue", "ivl", "factor", "reps", "lapses", "left", "due")
+
+# The weights of the eases 1 (again) to 4 (easy) in the answer stream
+EASES = (15, 15, 55, 15)
+_CUM_EASES = [sum(EASES[:i + 1]) for i in range(len(EASES))]
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
+
+
+class Divergence(AssertionError):
+    "Two variants scheduled the same answer differently."
+
+
+def fullState(card):
+    return (card.type, card.queue, card.ivl, card.factor,
+            card.reps, card.lapses, card.left, card.due)
+
+def singleLearningQueueState(card):
+    "The state without the day learning queue and the fuzz of the learning delays."
+    if card.queue in (1, 3):
+        return (card.type, 1, card.ivl, card.factor,
+                card.reps, card.lapses, card.left, None)
+    return fullState(card)
+
+def unfuzzedState(card):
+    "The state without the intervals, and the review dates derived from them."
+    return (card.type, card.queue, None, card.factor,
+            card.reps, card.lapses, card.left, card.due if card.queue == 1 else None)
+
+
+def answerCard(sched, card, ease):
+    sched.answerCard(card, ease)
+
+def answerBatch(sched, card, ease):
+    "Check preview() against nextIvl(), then answer with answerCards()."
+    ivls = sched.preview(card)
+    expected = tuple(sched.nextIvl(card, ease) for ease in range(1, 5))
+    if ivls != expected:
+        raise Divergence(f"preview() returned {ivls} for card {card.id}, nextIvl() {expected}")
+    sched.answerCards([(card, ease, schedv2.clock())])
+
+
+class CardFuzz:
+    "Replaces the random module of a copy of the scheduler (see above)."
+
+    Random = random.Random  # used to shuffle the queues
+
+    def __init__(self):
+        self.numbers = None  # The CardRandom of the card being answered
+
+    def randint(self, a, b):
+        return self.numbers.randint(a, b)
+
+    def randrange(self, a, b):
+        return self.numbers.randrange(a, b)
+
+
+class RandomShuffleScheduler(schedv2.Scheduler):
+    "The scheduler of schedv2.py, shuffling its queues like the copies."
+
+    def _shuffle(self, cards):
+        r = random.Random()
+        r.seed(self.today)
+        r.shuffle(cards)
+
+
+class Variant:
+
+    def __init__(self, name, module, reference=None, state=fullState, answer=answerCard, sameOrder=True,
+                 scheduler=None):
+        self.name = name            # The name used in the reports
+        self.module = module        # The scheduler module (Collection, Note, Card)
+        self.reference = reference  # The name of the variant to compare with
+        self.state = state          # The function returning the compared state of a card
+        self.answer = answer        # The function answering a card: answer(sched, card, ease)
+        self.sameOrder = sameOrder  # True if getCard() must return the same cards as the reference
+        self.scheduler = scheduler  # The scheduler class, when not the one of the module
+
+
+# The first variant drives the answer stream
+VARIANTS = [
+    Variant("schedv2", schedv2),
+    Variant("schedv2 (random shuffle)", schedv2, reference="schedv2",
+            sameOrder=False, scheduler=RandomShuffleScheduler),
+    Variant("schedv2_minimal_v1", schedv2_minimal_v1, reference="schedv2 (random shuffle)"),
+    Variant("schedv2_annotated", schedv2_annotated, reference="schedv2_minimal_v1"),
+    Variant("schedv2_minimal_v2", schedv2_minimal_v2, reference="schedv2_minimal_v1",
+            state=singleLearningQueueState, sameOrder=False),
+    Variant("schedv2_minimal_v3", schedv2_minimal_v3, reference="schedv2_minimal_v2",
+            state=unfuzzedState, sameOrder=False),
+    # The queues are rebuilt after each batch, in a different order
+    Variant("schedv2 (answerCards)", schedv2, reference="schedv2",
+            answer=answerBatch, sameOrder=False),
+]
+
+
+def _addCard(col, module, id):
+    # Explicit ids, so that the cards of the different variants match
+    col.cards.append(module.Card(module.Note(id=id), id=id))
+
+
+def run(steps, seed=0, size=100, variants=VARIANTS):
+    """Apply STEPS random answers to collections of SIZE cards, one per variant.
+
+    Raise Divergence when a variant disagrees with its reference. Return the
+    number of answers."""
+    modules = list({id(v.module): v.module for v in variants}.values())
+    clocks = [VirtualClock(START).install(module) for module in modules]
+    fuzz = CardFuzz()
+    copies = [module for module in modules if not hasattr(module, "CardRandom")]
+    for module in copies:
+        module.random = fuzz
+    try:
+        return _run(steps, random.Random(seed), size, variants, clocks, fuzz)
+    finally:
+        for clock in clocks:
+            clock.uninstall()
+        for module in copies:
+            module.random = random
+
+
+def _run(steps, rng, size, variants, clocks, fuzz):
+    byName = {v.name: i for i, v in enumerate(variants)}
+    references = [byName[v.reference] if v.reference else None for v in variants]
+    checked = [(i, v, references[i]) for i, v in enumerate(variants) if v.reference]
+    ordered = [(i, v, references[i]) for i, v, r in checked if v.sameOrder]
+    cols = [v.module.Collection() for v in variants]
+    for v, col in zip(variants, cols):
+        if v.scheduler:
+            col.sched = v.scheduler(col)
+    for i in range(1, size + 1):
+        for v, col in zip(variants, cols):
+            _addCard(col, v.module, i)
+    scheds = [col.sched for col in cols]
+    nextId = size + 1
+    answers = 0
+
+    for step in range(steps):
+        r = rng.random()
+        if r < 0.01:
+            # a new note
+            for v, col in zip(variants, cols):
+                _addCard(col, v.module, nextId)
+            nextId += 1
+            continue
+        elif r < 0.012:
+            # back after a few days
+            delay = rng.randint(2, 30) * 86400
+        else:
+            delay = rng.randint(0, 120)
+        for clock in clocks:
+            clock.advance(delay)
+
+        if r < 0.1:
+            # an early review, or a card answered outside of its queue
+            card = cols[0].cards[rng.randrange(len(cols[0].cards))]
+            if card.queue < 0:
+                continue
+            cardId = card.id
+            # answerCard() relies on getCard() to roll over the day
+            for sched in scheds:
+                sched._checkDay()
+        else:
+            served = [sched.getCard() for sched in scheds]
+            if served[0] is None:
+                # done for today, back tomorrow morning
+                delay = scheds[0].dayCutoff - clocks[0].time() + rng.randint(6, 12) * 3600
+                for clock in clocks:
+                    clock.advance(delay)
+                continue
+            for i, v, ref in ordered:
+                if served[i] is None or served[i].id != served[ref].id:
+                    raise Divergence(f"step {step}: getCard() returned card {_id(served[i])} "
+                                     f"with {v.name}, {_id(served[ref])} with {variants[ref].name}")
+            cardId = served[0].id
+
+        ease = rng.choices((1, 2, 3, 4), cum_weights=_CUM_EASES)[0]
+        cards = [col.cards[cardId - 1] for col in cols]
+        for v, sched, card in zip(variants, scheds, cards):
+            fuzz.numbers = schedv2.CardRandom(card)
+            v.answer(sched, card, ease)
+        answers += 1
+
+        for i, v, ref in checked:
+            expected, actual = v.state(cards[ref]), v.state(cards[i])
+            if actual != expected:
+                diffs = ", ".join(f"{field}={a} (expected {e})"
+                                  for field, a, e in zip(FIELDS, actual, expected) if a != e)
+                raise Divergence(f"step {step}: {v.name} disagrees with {variants[ref].name} "
+                                 f"on card {cardId} answered with ease {ease}: {diffs}")
+    return answers
+
+def _id(card):
+    return card.id if card else None
+
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    start = time.perf_counter()
+    answers = run(steps, seed)
+    elapsed = time.perf_counter() - start
+    print(f"{steps} steps ({answers} answers x {len(VARIANTS)} variants) in {elapsed:.1f}s, "
+          f"{steps / elapsed:.0f} steps/s, no divergence")
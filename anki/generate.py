@@ -0,0 +1,140 @@
+"""
+Synthetic collections for benchmarks and stress tests.
+
+    col = generateCollection(1000000, seed=0)
+
+Notes and cards are created with explicit ids, directly in the card store
+(no wait on intId(), no call to Collection.addNote()). The state of the
+cards and their attributes follow configurable distributions. Each
+distribution is a function receiving a random.Random instance:
+
+    col = generateCollection(10000, states={NEW: 1, REVIEW: 9},
+                             ivl=lambda rng: rng.randint(1, 30))
+"""
+import datetime
+import gc
+import random
+import time
+from itertools import accumulate
+
+from schedv2 import Collection, Card, intTime, noteFactory
+
+# The (type, queue) of each card state
+NEW = (0, 0)
+LEARNING = (1, 1)
+REVIEW = (2, 2)
+RELEARNING = (3, 1)
+DAY_RELEARNING = (3, 3)
+SUSPENDED = (2, -1)
+
+# The weights of the card states in a deck studied for some months
+STATES = {NEW: 30, LEARNING: 2, REVIEW: 63, RELEARNING: 1, DAY_RELEARNING: 1, SUSPENDED: 3}
+
+
+def ivlDays(rng):
+    "Log-normal interval in days (median of 12 days, with a long tail)."
+    return min(36500, max(1, int(rng.lognormvariate(2.5, 1.2))))
+
+def factorPermille(rng):
+    "Normal ease factor around the starting factor."
+    return max(1300, int(rng.gauss(2500, 250)))
+
+def lapseCount(rng):
+    "Exponential number of lapses (most cards never lapsed)."
+    return int(rng.expovariate(1.5))
+
+def dueOffset(rng, ivl):
+    "Days between today and the due date of a review card (negative when overdue)."
+    return rng.randint(-max(1, ivl // 4), ivl)
+
+
+def generateCollection(size, seed=0, states=STATES, ivl=ivlDays, factor=factorPermille,
+                       lapses=lapseCount, due=dueOffset, now=None):
+    """Return a collection of SIZE cards, one per note.
+
+    STATES maps the (type, queue) of the cards to their weight. The other
+    distributions are used for the cards already seen. The collection is
+    created the day of NOW (a timestamp in seconds, the current time by
+    default) and learning cards are due around NOW: the same SEED and NOW
+    generate the same collection."""
+    # The garbage collector would scan the millions of new objects several
+    # times while they are created (see snapshot.load())
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _generate(size, random.Random(seed), states, ivl, factor, lapses, due, now)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _generate(size, rng, states, ivl, factor, lapses, due, now):
+    col = Collection()
+    if now is None:
+        now = intTime()
+    crt = int(now)
+    # The collection is created the day of NOW, whatever the current time
+    d = datetime.datetime.fromtimestamp(now)
+    col.crt = int(time.mktime(datetime.datetime(d.year, d.month, d.day).timetuple()))
+    sched = col.sched
+    sched.today = today = sched._daysSinceCreation(now)
+    sched.dayCutoff = sched._dayCutoff(now)
+    leechFails = col.deckConf["lapse"]["leechFails"]
+
+    # All notes use the same "Basic" model
+    makeNote = noteFactory()
+    newCard = Card.__new__
+
+    choices = rng.choices(list(states), cum_weights=list(accumulate(states.values())), k=size)
+    cards = col.cards
+    for i, (ctype, queue) in enumerate(choices, 1):
+        note = makeNote(i, [f"Front {i}", f"Back {i}"], [])
+
+        cardIvl = cardFactor = cardReps = cardLapses = left = 0
+        if ctype == 0:
+            cardDue = i
+        elif ctype == 1:
+            cardReps = rng.randint(1, 2)
+            left = 1001 if cardReps == 2 else 2002
+            cardDue = crt + rng.randint(-600, 600)
+        else:
+            cardIvl = ivl(rng)
+            cardFactor = factor(rng)
+            cardLapses = lapses(rng)
+            if ctype == 3:
+                cardLapses += 1
+            if queue == -1:
+                # Suspended as a leech
+                cardLapses = max(cardLapses, leechFails)
+                note.tags.append("leech")
+            else:
+                cardLapses = min(cardLapses, leechFails - 1)
+            cardReps = cardLapses + rng.randint(2, 10)
+            if queue == 1:
+                left = 1001
+                cardDue = crt + rng.randint(-600, 600)
+            elif queue == 3:
+                left = 1001
+                cardDue = today - rng.randint(0, 1)
+            else:
+                cardDue = today + due(rng, cardIvl)
+
+        card = newCard(Card)
+        card.__dict__ = {
+            "id": i, "note": note, "due": cardDue, "crt": crt,
+            "type": ctype, "queue": queue, "ivl": cardIvl, "factor": cardFactor,
+            "reps": cardReps, "lapses": cardLapses, "usn": 0, "left": left,
+        }
+        cards.append(card)
+    return col
+
+
+if __name__ == "__main__":
+    for size in [1000, 100000, 1000000]:
+        start = time.perf_counter()
+        col = generateCollection(size)
+        elapsed = time.perf_counter() - start
+        counts = {}
+        for card in col.cards:
+            counts[card.queue] = counts.get(card.queue, 0) + 1
+        print(f"{size:>8} cards in {elapsed:.2f}s, cards per queue: {dict(sorted(counts.items()))}")
@@ -0,0 +1,47 @@
+"""
+Stackable wrappers of the methods of a scheduler instance.
+
+The profiler (profiling.py) and the metrics (metrics.py) observe a scheduler
+by wrapping its methods. The wrappers of a method are kept in layers, so that
+several observers can be attached to the same scheduler, and detached in any
+order without removing the wrappers of the others:
+
+    handle = wrap(sched, "getCard", lambda getCard: ...)
+    ...
+    unwrap(handle)
+
+The wrapped method is set on the instance only: the other schedulers, and
+this one once all its wrappers are removed, run the original methods without
+any overhead. The scheduler calls its methods through self, so wrapping a
+method also wraps its internal calls (ex: answerCards() calls _answerCard()).
+"""
+
+
+def wrap(sched, name, wrapper):
+    """Wrap the method NAME of SCHED with WRAPPER(method), returning the new callable.
+
+    The wrapper is applied over the previous wrappers. Return a handle for unwrap()."""
+    layers = sched.__dict__.setdefault("_wrappers", {}).setdefault(name, [])
+    layers.append(wrapper)
+    _rebuild(sched, name, layers)
+    return (sched, name, wrapper)
+
+
+def unwrap(handle):
+    "Remove the wrapper returned by wrap(), keeping the others."
+    sched, name, wrapper = handle
+    layers = sched.__dict__["_wrappers"][name]
+    # By identity, a wrapper may be added twice
+    del layers[next(i for i, w in enumerate(layers) if w is wrapper)]
+    _rebuild(sched, name, layers)
+
+
+def _rebuild(sched, name, layers):
+    sched.__dict__.pop(name, None)
+    if not layers:
+        del sched.__dict__["_wrappers"][name]
+        return
+    method = getattr(sched, name)
+    for wrapper in layers:
+        method = wrapper(method)
+    setattr(sched, name, method)
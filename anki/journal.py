@@ -0,0 +1,186 @@
+"""
+Write-ahead log of the answers made on a collection.
+
+The collection only lives in memory. To not lose the answers when the
+process dies, the scheduler appends each answer (card id, ease, timestamp,
+and a log sequence number) to a log file before applying it:
+
+    col = Collection()
+    col.sched.log = AnswerLog("answers.log")
+    ...
+    col.sched.answerCard(card, 3)
+
+The changes of the deck configuration are logged too (see
+Scheduler.changeDeckConf), as they change how the next answers are
+scheduled.
+
+On startup, the changes are replayed over the last saved state of the
+collection:
+
+    replayed, unknown = replay(col, "answers.log")
+
+The log sequence number (col.lsn) is only incremented by the logged changes,
+and saved with the collection (see snapshot.py). The records with a sequence
+number already reached by the saved collection are skipped, so that a log
+which was not truncated after a save (ex: a crash in between) is not applied
+twice. The creation of the cards is not logged: the answers to cards missing
+from the saved collection are skipped too, and their ids returned.
+
+Calling fsync() after each answer would cost milliseconds. Instead, answers
+are committed in groups: they are buffered and written with a single fsync()
+once `groupSize` answers are pending, or by a timer `groupDelay` seconds
+after the oldest pending answer. Only the answers of the last uncommitted
+group can be lost.
+"""
+import json
+import os
+import struct
+import threading
+
+# card id, ease, timestamp in seconds, log sequence number.
+# A record with an ease of 0 is a change of the deck configuration, followed
+# by the configuration as a JSON document whose length replaces the card id.
+RECORD = struct.Struct("<qBdq")
+
+
+class AnswerLog:
+
+    def __init__(self, path, groupSize=64, groupDelay=0.05):
+        self.path = path
+        self.groupSize = groupSize    # Maximal number of answers waiting for a fsync
+        self.groupDelay = groupDelay  # Maximal delay in seconds before an answer is fsync'ed
+        self._file = open(path, "ab")
+        self._buffer = bytearray()    # Packed answers not committed yet
+        self._pending = 0             # Number of answers in the buffer
+        self._timer = None            # Commits the buffer groupDelay seconds after its oldest answer
+        self._lock = threading.Lock()       # Protects the buffer, the timer commits from its own thread
+        self._writeLock = threading.Lock()  # Serializes the writes, held during the fsync
+
+    def append(self, card, ease, timestamp, lsn):
+        "Log an answer. The answer is durable once committed."
+        self._append(RECORD.pack(card.id, ease, timestamp, lsn))
+
+    def appendDeckConf(self, deckConf, timestamp, lsn):
+        "Log a change of the deck configuration."
+        doc = json.dumps(deckConf).encode("utf-8")
+        self._append(RECORD.pack(len(doc), 0, timestamp, lsn) + doc)
+
+    def _append(self, record):
+        with self._lock:
+            self._buffer += record
+            self._pending += 1
+            full = self._pending >= self.groupSize
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.groupDelay, self.commit)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.commit()
+
+    def commit(self):
+        """Write and fsync the pending answers.
+
+        The buffer is swapped under the lock, and written outside of it, so
+        that the answers made during a fsync are not blocked."""
+        with self._writeLock:
+            with self._lock:
+                self._cancelTimer()
+                if not self._pending or self._file.closed:
+                    return
+                buffer, self._buffer = self._buffer, bytearray()
+                self._pending = 0
+            self._file.write(buffer)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _cancelTimer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def truncate(self):
+        "Discard the logged answers, once the collection has been saved."
+        with self._writeLock:
+            with self._lock:
+                self._cancelTimer()
+                self._buffer.clear()
+                self._pending = 0
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.commit()
+        with self._writeLock:
+            self._file.close()
+
+
+def readLog(path):
+    """Return the records logged in the file at PATH.
+
+    Each record is a (card id, ease, timestamp, lsn, deck configuration)
+    tuple, with a configuration only for the changes of configuration."""
+    with open(path, "rb") as f:
+        data = f.read()
+    records = []
+    offset = 0
+    # The last record may have been partially written before a crash
+    while offset + RECORD.size <= len(data):
+        cid, ease, timestamp, lsn = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if ease:
+            records.append((cid, ease, timestamp, lsn, None))
+            continue
+        if offset + cid > len(data):
+            break
+        deckConf = json.loads(data[offset:offset + cid])
+        offset += cid
+        records.append((None, 0, timestamp, lsn, deckConf))
+    return records
+
+
+def readAnswers(path):
+    "Return the (card id, ease, timestamp, lsn) of the answers logged in the file at PATH."
+    return [record[:4] for record in readLog(path) if record[1]]
+
+
+def replay(col, path):
+    """Reapply the changes logged in the file at PATH on COL.
+
+    The answers were checked before being logged, and are replayed in the
+    same order over the same state. The changes already part of COL (up to
+    its lsn) are skipped. Return the
+    number of replayed answers and the ids of the unknown cards whose answers
+    were skipped."""
+    if not os.path.exists(path):
+        return 0, []
+    sched = col.sched
+    cards = {card.id: card for card in col.cards}
+    answers = []
+    replayed = 0
+    unknown = []
+    # The changes are already in the log
+    log, sched.log = sched.log, None
+    try:
+        for cid, ease, timestamp, lsn, deckConf in readLog(path):
+            if lsn <= col.lsn:
+                continue
+            if deckConf is not None:
+                # the answers before the change use the previous configuration
+                sched.answerCards(answers)
+                replayed += len(answers)
+                answers = []
+                sched.changeDeckConf(deckConf)
+            else:
+                card = cards.get(cid)
+                if card is None:
+                    # added after the last save
+                    unknown.append(cid)
+                else:
+                    answers.append((card, ease, timestamp))
+            col.lsn = lsn
+        sched.answerCards(answers)
+        replayed += len(answers)
+    finally:
+        sched.log = log
+    return replayed, unknown
@@ -0,0 +1,169 @@
+"""
+Metrics of the schedulers, exposed in the Prometheus text format.
+
+    metrics = Metrics()
+    metrics.attach(col.sched, "collection-1")
+    server = serve(metrics, port=9090)
+    # curl http://127.0.0.1:9090/metrics
+    ...
+    server.shutdown()
+    server.server_close()
+
+The counters are updated by wrapping the methods of the attached scheduler
+instances (see hooks.py), the queue depths are read when the metrics are
+scraped. Each collection is identified by the label "collection":
+
+    # TYPE anki_cards_served_total counter
+    anki_cards_served_total{collection="collection-1",queue="rev"} 12
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from hooks import wrap, unwrap
+
+# card.queue => name of the queue
+QUEUE_NAMES = {0: "new", 1: "lrn", 2: "rev", 3: "lrnDay"}
+
+# name of the queue => scheduler attribute, and method refilling it
+QUEUES = {
+    "new": ("_newQueue", "_fillNew"),
+    "lrn": ("_lrnQueue", "_fillLrn"),
+    "lrnDay": ("_lrnDayQueue", "_fillLrnDay"),
+    "rev": ("_revQueue", "_fillRev"),
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics:
+
+    def __init__(self):
+        self.schedulers = {}  # collection name => scheduler
+        self.served = {}      # (collection name, queue name) => cards returned by getCard()
+        self.answers = {}     # (collection name, ease) => cards answered, one by one or in a batch
+        self.refills = {}     # (collection name, queue name) => queue rebuilt while empty
+        self.leeches = {}     # collection name => cards suspended as leeches
+        self._handles = {}    # collection name => handles of the wrappers
+
+    def attach(self, sched, name):
+        "Start collecting the metrics of SCHED, labeled with NAME."
+        if name in self.schedulers:
+            raise ValueError(f"A collection named {name} is already attached")
+        self.schedulers[name] = sched
+        for queue in QUEUES:
+            self.served.setdefault((name, queue), 0)
+            self.refills.setdefault((name, queue), 0)
+        for ease in range(1, 5):
+            self.answers.setdefault((name, ease), 0)
+        self.leeches.setdefault(name, 0)
+
+        served, answers, leeches = self.served, self.answers, self.leeches
+
+        def countGetCard(getCard):
+            def countedGetCard():
+                card = getCard()
+                if card:
+                    served[name, QUEUE_NAMES[card.queue]] += 1
+                return card
+            return countedGetCard
+
+        # answerCard() and answerCards() both call _answerCard() for each answer
+        def countAnswerCard(answerCard):
+            def countedAnswerCard(card, ease):
+                answerCard(card, ease)
+                answers[name, ease] += 1
+            return countedAnswerCard
+
+        def countCheckLeech(checkLeech):
+            def countedCheckLeech(card, conf):
+                suspended = checkLeech(card, conf)
+                if suspended:
+                    leeches[name] += 1
+                return suspended
+            return countedCheckLeech
+
+        handles = [
+            wrap(sched, "getCard", countGetCard),
+            wrap(sched, "_answerCard", countAnswerCard),
+            wrap(sched, "_checkLeech", countCheckLeech),
+        ]
+        for queue, (attr, method) in QUEUES.items():
+            handles.append(wrap(sched, method, self._countRefills(sched, name, queue, attr)))
+        self._handles[name] = handles
+
+    def _countRefills(self, sched, name, queue, attr):
+        refills = self.refills
+
+        def countRefills(fill):
+            def countedFill():
+                empty = not getattr(sched, attr)
+                result = fill()
+                if empty and getattr(sched, attr):
+                    refills[name, queue] += 1
+                return result
+            return countedFill
+
+        return countRefills
+
+    def detach(self, name):
+        "Stop collecting the metrics of the collection NAME. The counters are kept."
+        del self.schedulers[name]
+        for handle in self._handles.pop(name):
+            unwrap(handle)
+
+    def exposition(self):
+        "Return the metrics in the Prometheus text format."
+        lines = []
+
+        def family(metric, kind, help, samples):
+            lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in samples:
+                text = ",".join(f'{key}="{_escape(str(v))}"' for key, v in labels)
+                lines.append(f"{metric}{{{text}}} {value}")
+
+        family("anki_cards_served_total", "counter", "Cards returned by getCard(), by queue.",
+               [((("collection", c), ("queue", q)), n) for (c, q), n in list(self.served.items())])
+        family("anki_answers_total", "counter", "Cards answered, by ease.",
+               [((("collection", c), ("ease", e)), n) for (c, e), n in list(self.answers.items())])
+        family("anki_queue_refills_total", "counter", "Queues rebuilt from the collection while empty.",
+               [((("collection", c), ("queue", q)), n) for (c, q), n in list(self.refills.items())])
+        family("anki_leeches_total", "counter", "Cards suspended as leeches.",
+               [((("collection", c),), n) for c, n in list(self.leeches.items())])
+        family("anki_queue_depth", "gauge", "Cards in the queues of the scheduler.",
+               [((("collection", c), ("queue", q)), len(getattr(sched, attr)))
+                for c, sched in list(self.schedulers.items())
+                for q, (attr, method) in QUEUES.items()])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def serve(metrics, port=9090, host="127.0.0.1"):
+    """Serve the exposition of METRICS on http://HOST:PORT/metrics.
+
+    The server runs in a daemon thread. Use port=0 to pick a free port (see
+    server.server_address). Stop the server with server.shutdown() and
+    server.server_close()."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # No log for each scrape
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,106 @@
+"""
+Opt-in profiling of the hot paths of the scheduler.
+
+    profiler = Profiler()
+    profiler.attach(col.sched)
+    ...
+    profiler.snapshot()
+    # {"_fillRev": {"calls": 12, "totalNs": 51234, "maxNs": 9120,
+    #               "histogram": {4096: 3, 8192: 8, 16384: 1}}, ...}
+    profiler.detach(col.sched)
+
+attach() wraps the methods of a single scheduler instance (see hooks.py).
+The other schedulers, and this one once detached, run the original methods
+without any overhead. The answers are profiled in answerCard(), answerCards()
+and in _answerCard(), called for each answer by both.
+
+The latencies are counted in histograms with power-of-two buckets: the
+bucket 4096 counts the calls lasting between 2048 and 4095 nanoseconds.
+The latency of a method includes the methods it calls (ex: getCard() calls
+_fillRev()). A high number of calls to _fill* compared to getCard() reveals
+queue-refill storms.
+"""
+import time
+from functools import partial
+
+from hooks import wrap, unwrap
+
+# The methods profiled by default
+HOT_PATHS = (
+    "getCard", "answerCard", "answerCards", "_answerCard",
+    "_fillNew", "_fillLrn", "_fillLrnDay", "_fillRev",
+    "_resetNew", "_resetLrn", "_resetRev",
+)
+
+
+class MethodStats:
+
+    def __init__(self):
+        self.histogram = [0] * 64  # The bucket i counts the calls lasting less than 2**i ns
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.totalNs = 0
+        self.maxNs = 0
+        # In place, as the profiled methods reference the histogram
+        self.histogram[:] = [0] * 64
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "totalNs": self.totalNs,
+            "maxNs": self.maxNs,
+            "histogram": {2**i: n for i, n in enumerate(self.histogram) if n},
+        }
+
+
+class Profiler:
+
+    def __init__(self, methods=HOT_PATHS):
+        self.methods = methods  # The names of the scheduler methods to profile
+        self.stats = {name: MethodStats() for name in methods}
+        self._handles = {}  # id of an attached scheduler => handles of its wrappers
+
+    def attach(self, sched):
+        "Start profiling the scheduler SCHED."
+        if id(sched) in self._handles:
+            raise ValueError("The scheduler is already profiled")
+        self._handles[id(sched)] = [
+            wrap(sched, name, partial(self._wrap, stats=self.stats[name]))
+            for name in self.methods]
+
+    def detach(self, sched):
+        "Stop profiling the scheduler SCHED. The statistics are kept."
+        for handle in self._handles.pop(id(sched), ()):
+            unwrap(handle)
+
+    def _wrap(self, method, stats):
+        perfCounter = time.perf_counter_ns
+        histogram = stats.histogram
+
+        def profiled(*args, **kwargs):
+            start = perfCounter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                ns = perfCounter() - start
+                stats.calls += 1
+                stats.totalNs += ns
+                if ns > stats.maxNs:
+                    stats.maxNs = ns
+                histogram[ns.bit_length()] += 1
+
+        profiled.__wrapped__ = method
+        return profiled
+
+    def snapshot(self, reset=False):
+        "Return the statistics of each method, as a JSON-serializable dict."
+        snapshot = {name: stats.snapshot() for name, stats in self.stats.items()}
+        if reset:
+            self.reset()
+        return snapshot
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats.reset()
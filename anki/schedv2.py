@@ -1,5 +1,6 @@
+import copy
 import time
-import random
+import heapq
 import datetime
 
 # Whether new cards should be mixed with reviews, or shown first or last
@@ -7,24 +8,76 @@ NEW_CARDS_DISTRIBUTE = 0
 NEW_CARDS_LAST = 1
 NEW_CARDS_FIRST = 2
 
+# In which order the due reviews are shown
+REV_CARDS_DUE = 0       # Shuffled, among the cards due the earliest
+REV_CARDS_OVERDUE = 1   # The most overdue relative to their interval first
+
 # The initial factor when card get promoted
 STARTING_FACTOR = 2500
 
 
 ## Utils
 
+# The source of the current time in seconds, and the source of unique ids.
+# Both can be replaced to run the scheduler in a virtual time (see virtualclock.py).
+clock = time.time
+
 def intTime(scale=1):
     "The time in integer seconds. Pass scale=1000 to get milliseconds."
-    return int(time.time()*scale)
+    return int(clock()*scale)
 
-def intId():
-    """Returns a unique integer identifier."""
+def wallClockId():
+    """Returns a unique integer identifier based on the wall clock."""
     t = intTime(1000)
     # Make sure the next call to the function returns a different value
     while intTime(1000) == t:
         time.sleep(1)
     return t
 
+idSource = wallClockId
+
+def intId():
+    """Returns a unique integer identifier."""
+    return idSource()
+
+def mix64(x):
+    "Returns a 64-bit hash of the integer X (the SplitMix64 finalizer)."
+    x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+class CardRandom:
+    """The random numbers used to schedule the next review of a card.
+
+    The numbers are hashed from the card id, its number of reviews so far
+    and a counter, instead of being drawn from a shared generator, so that
+    they do not depend on the other cards answered before (ex: in a batch,
+    see Scheduler.answerCards). The load-balanced fuzz still depends on the
+    reviews already scheduled (see Scheduler._leastLoadedIvl)."""
+
+    __slots__ = ("key", "counter")
+
+    def __init__(self, card):
+        self.key = mix64(mix64(card.id) ^ card.reps)
+        self.counter = 0
+
+    def _next(self):
+        self.counter += 1
+        return mix64(self.key + self.counter)
+
+    def randint(self, a, b):
+        "Return a random integer in [A, B]."
+        return a + self._next() % (b - a + 1)
+
+    def randrange(self, a, b):
+        "Return a random integer in [A, B)."
+        return a + self._next() % (b - a)
+
+    def choice(self, seq):
+        return seq[self._next() % len(seq)]
+
 
 # Default collection configuration
 colDefaultConf = {
@@ -97,6 +150,16 @@ deckDefaultConf = {
         'hardFactor': 1.2,
         # The multiplication factor applied to the interval for cards
         # in review when pressing "Hard"
+
+        'order': REV_CARDS_DUE,
+        # In which order to show the due reviews:
+        # - REV_CARDS_DUE (shuffle the cards due the earliest)
+        # - REV_CARDS_OVERDUE (the largest days late / interval first,
+        #   to catch up with a backlog)
+
+        'loadBalance': False,
+        # Pick the day with the fewest reviews due in the fuzz range,
+        # instead of a random day, to smooth the daily workload.
     },
 }
 
@@ -105,12 +168,15 @@ class Collection:
 
     # anki/anki/collection.py
     def __init__(self, id=None):
-        d = datetime.datetime.today()
+        d = datetime.datetime.fromtimestamp(clock())
         d = datetime.datetime(d.year, d.month, d.day)
         self.crt = int(time.mktime(d.timetuple()))  # Timestamp of the creation date in seconds.
         self.cards = []                             # In-memory list of cards (as we are not using a SQL database)
         self.colConf = colDefaultConf               # Configuration of the collection
-        self.deckConf = deckDefaultConf             # Configuration of the deck (we consider only a single deck)
+        self.deckConf = copy.deepcopy(deckDefaultConf)  # Configuration of the deck (we consider only a single deck)
+        self.usn = 0                                # Sequence number incremented each time a card is modified
+        self.lsn = 0                                # Sequence number of the last change written to the log (see journal.py)
+        self._modified = {}                         # Modified cards by id, ordered by modification
         self.sched = Scheduler(self)
 
     def addNote(self, note):
@@ -118,10 +184,33 @@ class Collection:
         # add cards
         ncards = 0
         for template in note.templates:
-            self.cards.append(self._newCard(note, template))
+            card = self._newCard(note, template)
+            self.cards.append(card)
+            self.markModified(card)
             ncards += 1
         return ncards
 
+    def markModified(self, card):
+        "Record that CARD has changed and needs to be saved."
+        self.usn += 1
+        card.usn = self.usn
+        # Move the card at the end to keep the cards ordered by usn
+        self._modified.pop(card.id, None)
+        self._modified[card.id] = card
+
+    def changesSince(self, usn):
+        """Return the cards modified after the sequence number USN, oldest first.
+
+        Only the modified cards are visited, so saving the changes since
+        the last checkpoint does not require to scan the whole collection."""
+        changes = []
+        for card in reversed(self._modified.values()):
+            if card.usn <= usn:
+                break
+            changes.append(card)
+        changes.reverse()
+        return changes
+
     def _newCard(self, note, template):
         "Create a new card."
         card = Card(note)
@@ -189,6 +278,27 @@ class Note:
         return key in list(self._fmap.keys())
 
 
+def noteFactory():
+    """Return a function creating a "Basic" note from its id, fields and tags.
+
+    Used to create many notes at once (ex: snapshot.load()). The notes share
+    the fields map and the templates of the model, and Note.__init__ is
+    skipped, as it creates them for each note."""
+    model = Note(id=1)
+    fmap, templates = model._fmap, model.templates
+    newNote = Note.__new__
+
+    def makeNote(id, fields, tags):
+        note = newNote(Note)
+        note.id = id
+        note.tags = tags
+        note.fields = fields
+        note._fmap = fmap
+        note.templates = templates
+        return note
+    return makeNote
+
+
 class Card:
     # anki/anki/cards.py
     def __init__(self, note, id=None):
@@ -210,6 +320,7 @@ class Card:
         self.factor = 0         # The ease factor in permille (ex: 2500 = the interval will be multiplied by 2.5 the next time you press "Good")
         self.reps = 0           # The number of reviews
         self.lapses = 0         # The number of times the card went from a "was answered correctly" to "was answered incorrectly" state
+        self.usn = 0            # The collection sequence number of the last modification (see Collection.changesSince)
         self.left = 0           # Of the form a*1000+b, with:
                                 #   a the number of reps left today
                                 #   b the number of reps left till graduation
@@ -228,6 +339,10 @@ class Scheduler:
         self.reps = 0            # The number of today already reviewed cards
         self.today = None        # The number of days since the collection creation
         self._lrnCutoff = 0      # The timestamp in seconds to determine the learn ahead limit
+        self._answerTime = None  # The timestamp of the answer being applied by answerCards()
+        self.log = None          # An optional write-ahead log of the answers (see journal.py)
+        self._dueCounts = None   # The number of review cards due each day (see _dueLoad)
+        self._random = None      # The random numbers of the card being answered
         self.reset()
 
     def getCard(self):
@@ -239,6 +354,8 @@ class Scheduler:
             return card
 
     def reset(self):
+        # the cards may have been modified outside of the scheduler
+        self._dueCounts = None
         self._updateCutoff()
         self._resetLrn()
         self._resetRev()
@@ -246,8 +363,60 @@ class Scheduler:
 
     def answerCard(self, card, ease):
         assert 1 <= ease <= 4
-        assert 0 <= card.queue <= 4
+        assert 0 <= card.queue <= 3
+
+        self._answerCard(card, ease)
+
+    def answerCards(self, answers):
+        """Answer a batch of cards, for example when an offline client syncs.
+
+        ANSWERS is an iterable of (card, ease, timestamp) applied in order,
+        each one scheduled as if it had been answered at TIMESTAMP (in
+        seconds). The day cutoff is only recomputed when the answers cross a
+        day, and the queues are rebuilt once at the end instead of after each
+        answer.
+
+        Each answer is checked just before being applied, as a previous
+        answer of the batch may have changed the card (ex: suspended as a
+        leech). An invalid answer raises ValueError before being logged or
+        applied: the previous answers of the batch are kept, the next ones
+        are not applied.
+        """
+        today, dayCutoff = self.today, self.dayCutoff
+        answer = self._answerCard
+        dayStart, dayEnd = dayCutoff - 86400, dayCutoff
+        try:
+            for card, ease, timestamp in answers:
+                if not 1 <= ease <= 4:
+                    raise ValueError(f"Invalid ease {ease} for the card {card.id}")
+                if not 0 <= card.queue <= 3:
+                    raise ValueError(f"The card {card.id} can't be answered (queue {card.queue})")
+                if not dayStart <= timestamp < dayEnd:
+                    # the answer was made another day
+                    self.today = self._daysSinceCreation(timestamp)
+                    self.dayCutoff = dayEnd = self._dayCutoff(timestamp)
+                    dayStart = dayEnd - 86400
+                self._answerTime = timestamp
+                answer(card, ease)
+        finally:
+            self._answerTime = None
+            self.today, self.dayCutoff = today, dayCutoff
+
+            # answered cards may still be present in the queues
+            self._resetLrn()
+            self._resetRev()
+            self._resetNew()
 
+    def _answerCard(self, card, ease):
+        if self.log:
+            # log the answer before applying it
+            self.col.lsn += 1
+            self.log.append(card, ease, self._time(), self.col.lsn)
+
+        # the review date before the answer (see _dueLoad)
+        prevDue = card.due if card.queue == 2 else None
+
+        self._random = CardRandom(card)
         card.reps += 1
 
         if card.queue == 0:
@@ -264,6 +433,15 @@ class Scheduler:
         else:
             assert 0
 
+        counts = self._dueCounts
+        if counts is not None:
+            if prevDue is not None:
+                counts[prevDue] -= 1
+            if card.queue == 2:
+                counts[card.due] = counts.get(card.due, 0) + 1
+
+        self.col.markModified(card)
+
     # Getting the next card
     ##########################################################################
 
@@ -385,9 +563,7 @@ class Scheduler:
         self._lrnDayQueue = self._lrnDayQueue[:self.queueLimit]
         if self._lrnDayQueue:
             # order
-            r = random.Random()
-            r.seed(self.today)
-            r.shuffle(self._lrnDayQueue)
+            self._shuffle(self._lrnDayQueue)
             return True
 
     def _getLrnDayCard(self):
@@ -441,12 +617,12 @@ class Scheduler:
         if delay is None:
             delay = self._delayForGrade(conf, card.left)
 
-        card.due = int(time.time() + delay)
+        card.due = int(self._time() + delay)
         # due today?
         if card.due < self.dayCutoff:
             # add some randomness, up to 5 minutes or 25%
             maxExtra = min(300, int(delay*0.25))
-            fuzz = random.randrange(0, maxExtra)
+            fuzz = self._random.randrange(0, maxExtra)
             card.due = min(self.dayCutoff-1, card.due + fuzz)
             card.queue = 1
         else:
@@ -497,7 +673,7 @@ class Scheduler:
     def _leftToday(self, delays, left, now=None):
         "The number of steps that can be completed by the day cutoff."
         if not now:
-            now = intTime()
+            now = int(self._time())
         delays = delays[-left:]
         ok = 0
         for i in range(len(delays)):
@@ -537,21 +713,32 @@ class Scheduler:
     def _fillRev(self):
         if self._revQueue:
             return True
-        lim = min(self.queueLimit, self.col.deckConf["rev"]["perDay"])
-        self._revQueue = list(filter(lambda card: card.queue == 2 and card.due <= self.today, self.col.cards))
-        self._revQueue.sort(key=lambda card: card.due)
-        self._revQueue = self._revQueue[:lim]
+        conf = self.col.deckConf["rev"]
+        lim = min(self.queueLimit, conf["perDay"])
+        today = self.today
+        due = (card for card in self.col.cards if card.queue == 2 and card.due <= today)
+        # Only the first LIM cards are kept: a top-k selection in O(n log k)
+        # instead of sorting the whole backlog on each refill
+        if conf.get("order", REV_CARDS_DUE) == REV_CARDS_OVERDUE:
+            self._revQueue = heapq.nsmallest(lim, due, key=lambda card: (card.due - today) / (card.ivl or 1))
+            # the queue is popped from the end
+            self._revQueue.reverse()
+        else:
+            self._revQueue = heapq.nsmallest(lim, due, key=lambda card: card.due)
+            self._shuffle(self._revQueue)
 
         if self._revQueue:
-            r = random.Random()
-            r.seed(self.today)
-            r.shuffle(self._revQueue)
             return True
 
     def _getRevCard(self):
         if self._fillRev():
             return self._revQueue.pop()
 
+    def _shuffle(self, cards):
+        "Shuffle CARDS in place, in the same order for the whole day."
+        dayKey = mix64(self.today)
+        cards.sort(key=lambda card: mix64(card.id ^ dayKey))
+
     # Answering a review card
     ##########################################################################
 
@@ -598,7 +785,7 @@ class Scheduler:
             return self._nextLrnIvl(card, ease)
         elif ease == 1:
             # lapse
-            conf = self._lapseConf(card)
+            conf = self.col.deckConf["lapse"]
             if conf['delays']:
                 return conf['delays'][0]*60
             return self._lapseIvl(card, conf)*86400
@@ -625,6 +812,67 @@ class Scheduler:
             else:
                 return self._delayForGrade(conf, left)
 
+    def preview(self, card):
+        """Return the next intervals of CARD for the four buttons, in seconds.
+
+        Same values as nextIvl(card, 1..4) but computed in a single pass
+        and without modifying the card.
+        """
+        deckConf = self.col.deckConf
+        return self._previewCard(
+            card, deckConf["new"], deckConf["lapse"], deckConf["rev"])
+
+    def previewCards(self, cards):
+        "Return the next intervals of the four buttons for each of CARDS."
+        deckConf = self.col.deckConf
+        newConf, lapseConf, revConf = deckConf["new"], deckConf["lapse"], deckConf["rev"]
+        return [self._previewCard(card, newConf, lapseConf, revConf)
+                for card in cards]
+
+    def _previewCard(self, card, newConf, lapseConf, revConf):
+        # (re)learning?
+        if card.queue in [0, 1, 3]:
+            relearning = card.type in (2, 3)
+            conf = lapseConf if relearning else newConf
+            delays = conf['delays']
+            # new cards have not started their steps yet
+            if card.queue == 0:
+                left = len(delays)
+            else:
+                left = card.left % 1000
+            ivl1 = delays[0]*60
+            ivl2 = self._delayForRepeatingGrade(conf, left)
+            if relearning:
+                ivl4 = card.ivl * 86400
+            else:
+                ivl4 = conf['ints'][1] * 86400
+            if left - 1 <= 0:
+                # graduate
+                ivl3 = card.ivl * 86400 if relearning else conf['ints'][0] * 86400
+            else:
+                ivl3 = self._delayForGrade(conf, left - 1)
+            return (ivl1, ivl2, ivl3, ivl4)
+
+        # lapse
+        if lapseConf['delays']:
+            ivl1 = lapseConf['delays'][0]*60
+        else:
+            ivl1 = self._lapseIvl(card, lapseConf)*86400
+
+        # review (same as _nextRevIvl without fuzz)
+        delay = self._daysLate(card)
+        fct = card.factor / 1000
+        hardFactor = revConf.get("hardFactor", 1.2)
+        if hardFactor > 1:
+            hardMin = card.ivl
+        else:
+            hardMin = 0
+        ivl2 = self._constrainedIvl(card.ivl * hardFactor, revConf, hardMin, False)
+        ivl3 = self._constrainedIvl((card.ivl + delay // 2) * fct, revConf, ivl2, False)
+        ivl4 = self._constrainedIvl(
+            (card.ivl + delay) * fct * revConf['ease4'], revConf, ivl3, False)
+        return (ivl1, ivl2*86400, ivl3*86400, ivl4*86400)
+
     # Interval management
     ##########################################################################
 
@@ -652,7 +900,30 @@ class Scheduler:
 
     def _fuzzedIvl(self, ivl):
         min, max = self._fuzzIvlRange(ivl)
-        return random.randint(min, max)
+        if self.col.deckConf["rev"].get("loadBalance"):
+            return self._leastLoadedIvl(min, max)
+        return self._random.randint(min, max)
+
+    def _leastLoadedIvl(self, lo, hi):
+        "The interval between LO and HI with the fewest reviews due, at random among ties."
+        counts = self._dueLoad()
+        today = self.today
+        loads = [counts.get(today + ivl, 0) for ivl in range(lo, hi + 1)]
+        least = min(loads)
+        return self._random.choice([lo + i for i, load in enumerate(loads) if load == least])
+
+    def _dueLoad(self):
+        """The number of review cards due each day, by day.
+
+        Built on first use, then updated by each answer. reset() drops it
+        as the cards may have been changed outside of the scheduler."""
+        if self._dueCounts is None:
+            counts = {}
+            for card in self.col.cards:
+                if card.queue == 2:
+                    counts[card.due] = counts.get(card.due, 0) + 1
+            self._dueCounts = counts
+        return self._dueCounts
 
     def _fuzzIvlRange(self, ivl):
         if ivl < 2:
@@ -684,6 +955,70 @@ class Scheduler:
     def _updateRevIvl(self, card, ease):
         card.ivl = self._nextRevIvl(card, ease, fuzz=True)
 
+    # Configuration changes
+    ##########################################################################
+
+    def changeDeckConf(self, deckConf):
+        """Use DECKCONF as the deck configuration, and reschedule the cards
+        affected by a change of rev/ivlFct, rev/maxIvl or lapse/minInt.
+
+        The review cards keep the date of their last review (due - ivl) with
+        their new interval. The relearning cards get their new interval when
+        they graduate. Return the number of cards rescheduled.
+
+        DECKCONF must be a new configuration: the changes are found by
+        comparing it with the current one, which must not be edited in
+        place."""
+        old = self.col.deckConf
+        if deckConf is old or any(deckConf[key] is old[key] for key in ("rev", "lapse")):
+            raise ValueError("The deck configuration was edited in place, pass a copy")
+        if self.log:
+            # log the change before applying it
+            self.col.lsn += 1
+            self.log.appendDeckConf(deckConf, self._time(), self.col.lsn)
+        self.col.deckConf = deckConf
+        fct = deckConf["rev"].get("ivlFct", 1) / old["rev"].get("ivlFct", 1)
+        maxIvl = deckConf["rev"]["maxIvl"]
+        minInt = deckConf["lapse"]["minInt"]
+        if (fct == 1 and maxIvl >= old["rev"]["maxIvl"]
+                and minInt <= old["lapse"]["minInt"]):
+            # the intervals already given are still valid
+            return 0
+
+        # A single pass over the collection, without method calls for the
+        # cards left unchanged
+        markModified = self.col.markModified
+        changed = 0
+        for card in self.col.cards:
+            cardType = card.type
+            if cardType == 2:
+                if card.queue != 2:
+                    continue  # suspended
+                prev = card.ivl
+                ivl = int(prev * fct) or 1
+                if ivl > maxIvl:
+                    ivl = maxIvl
+                if ivl == prev:
+                    continue
+                card.ivl = ivl
+                card.due += ivl - prev
+            elif cardType == 3:
+                prev = card.ivl
+                ivl = min(max(prev, minInt), maxIvl)
+                if ivl == prev:
+                    continue
+                card.ivl = ivl
+            else:
+                continue
+            markModified(card)
+            changed += 1
+
+        if changed:
+            # the due counts and the review queue are rebuilt once, on next use
+            self._dueCounts = None
+            self._resetRev()
+        return changed
+
     # Leeches
     ##########################################################################
 
@@ -710,22 +1045,32 @@ class Scheduler:
         # end of day cutoff
         self.dayCutoff = self._dayCutoff()
 
+    def _time(self):
+        "The current time in seconds, or the time of the answer being applied."
+        if self._answerTime is not None:
+            return self._answerTime
+        return clock()
+
     def _checkDay(self):
         # check if the day has rolled over
-        if time.time() > self.dayCutoff:
+        if clock() > self.dayCutoff:
             self.reset()
 
-    def _dayCutoff(self):
-        date = datetime.datetime.today()
-        date = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        if date < datetime.datetime.today():
+    def _dayCutoff(self, now=None):
+        if now is None:
+            now = clock()
+        today = datetime.datetime.fromtimestamp(now)
+        date = today.replace(hour=0, minute=0, second=0, microsecond=0)
+        if date < today:
             date = date + datetime.timedelta(days=1)
         stamp = int(time.mktime(date.timetuple()))
         return stamp
 
-    def _daysSinceCreation(self):
+    def _daysSinceCreation(self, now=None):
+        if now is None:
+            now = clock()
         startDate = datetime.datetime.fromtimestamp(self.col.crt)
-        return int((time.time() - time.mktime(startDate.timetuple())) // 86400)
+        return int((now - time.mktime(startDate.timetuple())) // 86400)
 
     # Debug
     ##########################################################################
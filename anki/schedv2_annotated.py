@@ -17,18 +17,28 @@ STARTING_FACTOR = 2500
 
 ## Utils
 
+# The source of the current time in seconds, and the source of unique ids.
+# Both can be replaced to run the scheduler in a virtual time (see virtualclock.py).
+clock = time.time
+
 def intTime(scale=1):
     """The time in integer seconds. Pass scale=1000 to get milliseconds."""
-    return int(time.time()*scale)
+    return int(clock()*scale)
 
-def intId():
-    """Returns a unique integer identifier."""
+def wallClockId():
+    """Returns a unique integer identifier based on the wall clock."""
     t = intTime(1000)
     # Make sure the next call to the function returns a different value
     while intTime(1000) == t:
         time.sleep(1)
     return t
 
+idSource = wallClockId
+
+def intId():
+    """Returns a unique integer identifier."""
+    return idSource()
+
 # Default collection configuration
 # See anki/collections.py
 colDefaultConf = {
@@ -111,7 +121,7 @@ deckDefaultConf = {
 class Collection:
 
     def __init__(self, id=None):
-        d = datetime.datetime.today()
+        d = datetime.datetime.fromtimestamp(clock())
         d = datetime.datetime(d.year, d.month, d.day)
         self.crt = int(time.mktime(d.timetuple()))  # Timestamp of the creation date in seconds.
         self.cards = []                             # In-memory list of cards (as we are not using a SQL database)
@@ -497,7 +507,7 @@ class Scheduler:
         if delay is None:
             delay = self._delayForGrade(conf, card.left)
 
-        card.due = int(time.time() + delay)
+        card.due = int(clock() + delay)
         # due today?
         if card.due < self.dayCutoff:
             # add some randomness, up to 5 minutes or 25%
@@ -793,15 +803,15 @@ class Scheduler:
         # We reinitialize the queues if today is a new day.
 
         # check if the day has rolled over
-        if time.time() > self.dayCutoff:
+        if clock() > self.dayCutoff:
             self.reset()
 
     def _dayCutoff(self):
         # We return a timestamp to mark the end of the day.
         # The queues have to be refilled after this date.
-        date = datetime.datetime.today()
+        date = datetime.datetime.fromtimestamp(clock())
         date = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        if date < datetime.datetime.today():
+        if date < datetime.datetime.fromtimestamp(clock()):
             date = date + datetime.timedelta(days=1)
         stamp = int(time.mktime(date.timetuple()))
         return stamp
@@ -809,4 +819,4 @@ class Scheduler:
     def _daysSinceCreation(self):
         # We return the number of days since the creation of the collection.
         startDate = datetime.datetime.fromtimestamp(self.col.crt)
-        return int((time.time() - time.mktime(startDate.timetuple())) // 86400) # 86400s = 1d
+        return int((clock() - time.mktime(startDate.timetuple())) // 86400) # 86400s = 1d
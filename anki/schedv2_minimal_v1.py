@@ -17,18 +17,28 @@ STARTING_FACTOR = 2500
 
 ## Utils
 
+# The source of the current time in seconds, and the source of unique ids.
+# Both can be replaced to run the scheduler in a virtual time (see virtualclock.py).
+clock = time.time
+
 def intTime(scale=1):
     "The time in integer seconds. Pass scale=1000 to get milliseconds."
-    return int(time.time()*scale)
+    return int(clock()*scale)
 
-def intId():
-    """Returns a unique integer identifier."""
+def wallClockId():
+    """Returns a unique integer identifier based on the wall clock."""
     t = intTime(1000)
     # Make sure the next call to the function returns a different value
     while intTime(1000) == t:
         time.sleep(1)
     return t
 
+idSource = wallClockId
+
+def intId():
+    """Returns a unique integer identifier."""
+    return idSource()
+
 
 # Default collection configuration
 colDefaultConf = {
@@ -64,7 +74,7 @@ deckDefaultConf = {
 class Collection:
 
     def __init__(self, id=None):
-        d = datetime.datetime.today()
+        d = datetime.datetime.fromtimestamp(clock())
         d = datetime.datetime(d.year, d.month, d.day)
         self.crt = int(time.mktime(d.timetuple()))
         self.cards = []
@@ -336,7 +346,7 @@ class Scheduler:
         if delay is None:
             delay = self._delayForGrade(conf, card.left)
 
-        card.due = int(time.time() + delay)
+        card.due = int(clock() + delay)
         # due today?
         if card.due < self.dayCutoff:
             # add some randomness, up to 5 minutes or 25%
@@ -572,17 +582,17 @@ class Scheduler:
 
     def _checkDay(self):
         # check if the day has rolled over
-        if time.time() > self.dayCutoff:
+        if clock() > self.dayCutoff:
             self.reset()
 
     def _dayCutoff(self):
-        date = datetime.datetime.today()
+        date = datetime.datetime.fromtimestamp(clock())
         date = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        if date < datetime.datetime.today():
+        if date < datetime.datetime.fromtimestamp(clock()):
             date = date + datetime.timedelta(days=1)
         stamp = int(time.mktime(date.timetuple()))
         return stamp
 
     def _daysSinceCreation(self):
         startDate = datetime.datetime.fromtimestamp(self.col.crt)
-        return int((time.time() - time.mktime(startDate.timetuple())) // 86400)
+        return int((clock() - time.mktime(startDate.timetuple())) // 86400)
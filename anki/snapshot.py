@@ -0,0 +1,193 @@
+"""
+Binary snapshot of a collection and its scheduler.
+
+Recreating a collection note by note is slow. A snapshot saves the whole
+state in a compact binary file that is memory-mapped when restored:
+
+    snapshot.save(col, "collection.snap")
+    col.sched.log.truncate()  # The answers are now part of the snapshot
+
+    col = snapshot.load("collection.snap")
+    replayed, unknown = journal.replay(col, "answers.log")
+
+The file contains a fixed-size header, the cards stored column by column as
+little-endian 64-bit integers, the note ids, the queues as card indexes, a
+JSON document for the configuration, and the note fields and tags as text
+(fields are separated by \x1f as in the Anki database):
+
+    +--------+--------------+----------+--------+------+-------+
+    | header | card columns | note ids | queues | JSON | notes |
+    +--------+--------------+----------+--------+------+-------+
+"""
+import gc
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from schedv2 import Collection, Card, noteFactory
+
+MAGIC = b"SCHEDV2S"
+VERSION = 2
+
+# magic, version, number of cards, number of notes,
+# collection crt, usn, lsn, scheduler today, dayCutoff, _lrnCutoff, reps, newCardModulus,
+# length of the new, lrn, lrnDay, and rev queues, length of the JSON document,
+# length of the notes text
+HEADER = struct.Struct("<8sIQQ8q4QQQ")
+
+# The card attributes saved as columns ("note" is saved as the note index)
+CARD_COLUMNS = ("id", "note", "crt", "type", "queue", "ivl", "factor",
+                "reps", "lapses", "left", "due", "usn")
+
+QUEUES = ("_newQueue", "_lrnQueue", "_lrnDayQueue", "_revQueue")
+
+# Separators of the notes text
+FIELD_SEP = "\x1f"
+TAGS_SEP = "\x1d"
+NOTE_SEP = "\x1e"
+
+
+def _int64s(values):
+    "Return VALUES as little-endian 64-bit integers."
+    a = array("q", values)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a
+
+
+def save(col, path):
+    """Save COL and the state of its scheduler in the file at PATH.
+
+    The snapshot is written to a temporary file which replaces the previous
+    snapshot once on disk, so that a crash never leaves a partial snapshot."""
+    sched = col.sched
+
+    notes = []
+    noteIndexes = {}
+    for card in col.cards:
+        if id(card.note) not in noteIndexes:
+            noteIndexes[id(card.note)] = len(notes)
+            notes.append(card.note)
+    cardIndexes = {id(card): i for i, card in enumerate(col.cards)}
+
+    columns = []
+    for name in CARD_COLUMNS:
+        if name == "note":
+            columns.append(_int64s(noteIndexes[id(c.note)] for c in col.cards))
+        else:
+            columns.append(_int64s(getattr(c, name) for c in col.cards))
+    queues = [_int64s(cardIndexes[id(c)] for c in getattr(sched, name))
+              for name in QUEUES]
+    doc = json.dumps({
+        "colConf": col.colConf,
+        "deckConf": col.deckConf,
+    }).encode("utf-8")
+    text = NOTE_SEP.join(
+        FIELD_SEP.join(n.fields) + TAGS_SEP + " ".join(n.tags)
+        for n in notes).encode("utf-8")
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(
+            MAGIC, VERSION, len(col.cards), len(notes),
+            col.crt, col.usn, col.lsn,
+            sched.today, sched.dayCutoff, sched._lrnCutoff, sched.reps,
+            sched.newCardModulus,
+            *[len(q) for q in queues],
+            len(doc), len(text)))
+        for column in columns:
+            column.tofile(f)
+        _int64s(n.id for n in notes).tofile(f)
+        for q in queues:
+            q.tofile(f)
+        f.write(doc)
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(path):
+    "Restore the collection saved in the file at PATH."
+    # The garbage collector would scan the millions of new objects several
+    # times while they are created
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _load(mm)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _load(mm):
+    (magic, version, ncards, nnotes, crt, usn, lsn,
+     today, dayCutoff, lrnCutoff, reps, newCardModulus,
+     nnew, nlrn, nlrnDay, nrev, ndoc, ntext) = HEADER.unpack_from(mm)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a snapshot file")
+
+    offset = HEADER.size
+    view = memoryview(mm)
+
+    def read(n):
+        nonlocal offset
+        with view[offset:offset + n*8] as chunk:
+            offset += n*8
+            if sys.byteorder == "little":
+                # No copy, the integers are read from the mapped file
+                with chunk.cast("q") as values:
+                    return values.tolist()
+            a = array("q", chunk)
+            a.byteswap()
+            return a.tolist()
+
+    try:
+        columns = [read(ncards) for name in CARD_COLUMNS]
+        noteIds = read(nnotes)
+        queues = [read(n) for n in (nnew, nlrn, nlrnDay, nrev)]
+        doc = json.loads(bytes(view[offset:offset + ndoc]))
+        offset += ndoc
+        text = str(view[offset:offset + ntext], "utf-8")
+    finally:
+        view.release()
+
+    col = Collection()
+    col.crt = crt
+    col.usn = usn
+    col.lsn = lsn
+    col.colConf = doc["colConf"]
+    col.deckConf = doc["deckConf"]
+
+    # All notes use the same "Basic" model
+    makeNote = noteFactory()
+    notes = []
+    for nid, record in zip(noteIds, text.split(NOTE_SEP)):
+        fields, tags = record.split(TAGS_SEP)
+        notes.append(makeNote(nid, fields.split(FIELD_SEP), tags.split()))
+
+    cards = []
+    newCard = Card.__new__
+    for values in zip(*columns):
+        card = newCard(Card)
+        card.__dict__ = dict(zip(CARD_COLUMNS, values))
+        card.note = notes[card.note]
+        cards.append(card)
+    col.cards = cards
+    # The modified cards ordered by usn (see Collection.changesSince)
+    col._modified = {card.id: card for card in sorted(cards, key=lambda card: card.usn) if card.usn}
+
+    sched = col.sched
+    sched.today = today
+    sched.dayCutoff = dayCutoff
+    sched._lrnCutoff = lrnCutoff
+    sched.reps = reps
+    sched.newCardModulus = newCardModulus
+    for name, indexes in zip(QUEUES, queues):
+        setattr(sched, name, [cards[i] for i in indexes])
+    return col
@@ -0,0 +1,35 @@
+import time
+import unittest
+
+import schedv2
+import schedv2_minimal_v1
+from differential import Divergence, Variant, VARIANTS, run
+
+
+class TestDifferential(unittest.TestCase):
+
+    def test_variantsAgree(self):
+        answers = run(1500, seed=1, size=30)
+        assert answers > 500
+
+    def test_divergence(self):
+        def answerHarder(sched, card, ease):
+            sched.answerCard(card, max(1, ease - 1))
+        broken = Variant("broken", schedv2, reference="schedv2", answer=answerHarder)
+        with self.assertRaises(Divergence):
+            run(1500, seed=1, size=30, variants=[VARIANTS[0], broken])
+
+    def test_order(self):
+        # schedv2.py shuffles its queues differently than the copies
+        v1 = Variant("schedv2_minimal_v1", schedv2_minimal_v1, reference="schedv2")
+        with self.assertRaises(Divergence):
+            run(1500, seed=1, size=30, variants=[VARIANTS[0], v1])
+
+    def test_clockRestored(self):
+        run(10, seed=1, size=5)
+        # the virtual clocks are uninstalled
+        assert schedv2.clock is time.time
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import time
+import unittest
+
+import schedv2
+from generate import generateCollection, NEW, REVIEW, SUSPENDED
+from virtualclock import VirtualClock
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
+
+
+class TestGenerate(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock(START).install(schedv2)
+
+    def tearDown(self):
+        self.clock.uninstall()
+
+    def test_generateCollection(self):
+        d = generateCollection(1000, seed=1)
+        assert len(d.cards) == 1000
+        assert len({c.id for c in d.cards}) == 1000
+        assert len({c.note.id for c in d.cards}) == 1000
+        # the same seed and time generate the same collection
+        self.clock.advance(3600)
+        d2 = generateCollection(1000, seed=1, now=START)
+        assert d2.crt == d.crt
+        for c1, c2 in zip(d.cards, d2.cards):
+            for key in ('crt', 'type', 'queue', 'ivl', 'factor', 'reps', 'lapses', 'left', 'due'):
+                assert getattr(c1, key) == getattr(c2, key)
+        # the collection is created the day of NOW
+        d3 = generateCollection(10, seed=1, now=START - 86400)
+        assert d3.crt == d.crt - 86400
+        assert d3.sched.today == 0
+        for c in d.cards:
+            if c.queue == -1:
+                assert c.lapses >= 8
+                assert "leech" in c.note.tags
+            elif c.queue == 2:
+                assert c.ivl >= 1
+                assert c.factor >= 1300
+        # the scheduler can study the collection
+        c = d.sched.getCard()
+        d.sched.answerCard(c, 3)
+
+    def test_distributions(self):
+        d = generateCollection(100, states={NEW: 1, REVIEW: 3, SUSPENDED: 0},
+                               ivl=lambda rng: 7, due=lambda rng, ivl: -1)
+        assert {c.queue for c in d.cards} == {0, 2}
+        assert 50 < sum(c.queue == 2 for c in d.cards) < 95
+        for c in d.cards:
+            if c.queue == 2:
+                assert c.ivl == 7
+                assert c.due == d.sched.today - 1
+
+
+if __name__ == '__main__':
+    unittest.main()
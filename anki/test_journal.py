@@ -0,0 +1,218 @@
+import copy
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import schedv2
+from schedv2 import Collection, Note
+from journal import AnswerLog, RECORD, readAnswers, readLog, replay
+import snapshot
+from virtualclock import VirtualClock
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
+
+
+class TestAnswerLog(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock(START).install(schedv2)
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        fd, self.snapshotPath = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        self.clock.uninstall()
+        os.remove(self.path)
+        os.remove(self.snapshotPath)
+
+    def test_groupCommit(self):
+        d = Collection()
+        f = Note()
+        d.addNote(f)
+        c = d.cards[0]
+        log = AnswerLog(self.path, groupSize=2, groupDelay=60)
+        d.sched.log = log
+        d.sched.answerCard(c, 3)
+        # waiting for the group to fill
+        assert readAnswers(self.path) == []
+        d.sched.answerCard(c, 1)
+        answers = readAnswers(self.path)
+        assert [(cid, ease) for cid, ease, _, _ in answers] == [(c.id, 3), (c.id, 1)]
+        # the log sequence number of each answer
+        assert [lsn for _, _, _, lsn in answers] == [1, 2]
+        assert d.lsn == 2
+        log.close()
+
+    def test_groupDelay(self):
+        d = Collection()
+        d.addNote(Note())
+        c = d.cards[0]
+        log = AnswerLog(self.path, groupSize=64, groupDelay=0.01)
+        d.sched.log = log
+        d.sched.answerCard(c, 3)
+        # committed by the timer, without waiting for another answer
+        deadline = time.monotonic() + 2
+        while not readAnswers(self.path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [ease for _, ease, _, _ in readAnswers(self.path)] == [3]
+        log.close()
+
+    def test_appendDuringCommit(self):
+        d = Collection()
+        d.addNote(Note())
+        c = d.cards[0]
+        log = AnswerLog(self.path, groupSize=64, groupDelay=60)
+        d.sched.log = log
+        d.sched.answerCard(c, 3)
+        syncing, release, synced = threading.Event(), threading.Event(), threading.Event()
+
+        def slowFsync(fd):
+            syncing.set()
+            release.wait(2)
+            synced.set()
+
+        with mock.patch("journal.os.fsync", slowFsync):
+            committer = threading.Thread(target=log.commit)
+            committer.start()
+            assert syncing.wait(2)
+            # the answer is buffered while the previous group is fsync'ed
+            d.sched.answerCard(c, 1)
+            assert not synced.is_set()
+            release.set()
+            committer.join()
+        assert [ease for _, ease, _, _ in readAnswers(self.path)] == [3]
+        log.close()
+        assert [ease for _, ease, _, _ in readAnswers(self.path)] == [3, 1]
+
+    def test_replay(self):
+        d = Collection()
+        for i in range(2):
+            f = Note()
+            f['Front'] = str(i)
+            d.addNote(f)
+        # the last saved state
+        saved = copy.deepcopy(d.cards)
+
+        d.sched.log = AnswerLog(self.path)
+        c1, c2 = d.cards
+        d.sched.answerCard(c1, 3)
+        d.sched.answerCard(c2, 4)
+        d.sched.answerCard(c1, 1)
+        d.sched.log.close()
+        # simulate a partial write during a crash
+        with open(self.path, "ab") as f:
+            f.write(RECORD.pack(c1.id, 3, 0, 0)[:5])
+
+        d2 = Collection()
+        d2.cards = saved
+        # the same fuzz, as it only depends on the cards
+        assert replay(d2, self.path) == (3, [])
+        assert d2.lsn == d.lsn
+        for c, replayed in zip(d.cards, d2.cards):
+            for key in ('type', 'queue', 'ivl', 'due', 'factor', 'reps', 'lapses', 'left'):
+                assert getattr(replayed, key) == getattr(c, key)
+        # the answers are not applied twice (ex: the log was not truncated after a save)
+        assert replay(d2, self.path) == (0, [])
+        assert d2.cards[0].reps == d.cards[0].reps
+
+    def test_replayUnknownCard(self):
+        d = Collection()
+        d.addNote(Note())
+        saved = copy.deepcopy(d.cards)
+
+        d.sched.log = AnswerLog(self.path)
+        # a card added after the last save
+        d.addNote(Note())
+        c1, c2 = d.cards
+        d.sched.answerCard(c2, 3)
+        d.sched.answerCard(c1, 3)
+        d.sched.log.close()
+
+        d2 = Collection()
+        d2.cards = saved
+        assert replay(d2, self.path) == (1, [c2.id])
+        assert d2.cards[0].reps == c1.reps
+
+    def test_replayLeech(self):
+        d = Collection()
+        d.addNote(Note())
+        c = d.cards[0]
+        c.type = c.queue = 2
+        c.due = d.sched.today
+        c.ivl = 100
+        c.factor = 2500
+        c.lapses = 7
+        saved = copy.deepcopy(d.cards)
+
+        d.sched.log = AnswerLog(self.path)
+        t = schedv2.intTime()
+        # the second answer is invalid once the card is suspended as a leech
+        with self.assertRaises(ValueError):
+            d.sched.answerCards([(c, 1, t), (c, 3, t + 60)])
+        d.sched.log.close()
+        # and was not logged
+        assert [ease for _, ease, _, _ in readAnswers(self.path)] == [1]
+
+        d2 = Collection()
+        d2.cards = saved
+        assert replay(d2, self.path) == (1, [])
+        assert d2.cards[0].queue == -1
+
+    def test_replaySavedTwice(self):
+        d = Collection()
+        d.addNote(Note())
+        snapshot.save(d, self.snapshotPath)
+        # changes the usn without being logged
+        d.addNote(Note())
+        d.sched.log = AnswerLog(self.path)
+        c1, c2 = d.cards
+        d.sched.answerCard(c2, 3)
+        d.sched.answerCard(c1, 3)
+        d.sched.log.close()
+
+        # crash, then replay and save before truncating the log
+        d2 = snapshot.load(self.snapshotPath)
+        assert replay(d2, self.path) == (1, [c2.id])
+        assert d2.cards[0].reps == 1
+        snapshot.save(d2, self.snapshotPath)
+
+        # crash again, the answers are not applied twice
+        d3 = snapshot.load(self.snapshotPath)
+        assert d3.lsn == 2
+        assert replay(d3, self.path) == (0, [])
+        assert d3.cards[0].reps == 1
+
+    def test_replayDeckConf(self):
+        d = Collection()
+        d.addNote(Note())
+        c = d.cards[0]
+        c.type = c.queue = 2
+        c.due = d.sched.today
+        c.ivl = 100
+        c.factor = 2500
+        saved = copy.deepcopy(d.cards)
+
+        d.sched.log = AnswerLog(self.path)
+        deckConf = copy.deepcopy(d.deckConf)
+        deckConf['rev']['maxIvl'] = 50
+        d.sched.changeDeckConf(deckConf)
+        d.sched.answerCard(c, 3)
+        d.sched.log.close()
+        assert [(ease, conf) for _, ease, _, _, conf in readLog(self.path)] == [(0, deckConf), (3, None)]
+
+        d2 = Collection()
+        d2.cards = saved
+        # the answer is scheduled with the new configuration
+        assert replay(d2, self.path) == (1, [])
+        assert d2.deckConf == deckConf
+        assert d2.lsn == d.lsn == 2
+        assert d2.cards[0].ivl == c.ivl == 50
+
+
+if __name__ == '__main__':
+    unittest.main()
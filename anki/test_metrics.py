@@ -0,0 +1,92 @@
+import time
+import unittest
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import schedv2
+from schedv2 import Collection, Note
+from metrics import Metrics, serve
+from profiling import Profiler
+from virtualclock import VirtualClock
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock(START).install(schedv2)
+
+    def tearDown(self):
+        self.clock.uninstall()
+
+    def test_counters(self):
+        d = Collection()
+        f = Note()
+        d.addNote(f)
+        metrics = Metrics()
+        metrics.attach(d.sched, "col1")
+        c = d.sched.getCard()
+        d.sched.answerCard(c, 1)
+        text = metrics.exposition()
+        assert '# TYPE anki_cards_served_total counter' in text
+        assert 'anki_cards_served_total{collection="col1",queue="new"} 1' in text
+        assert 'anki_answers_total{collection="col1",ease="1"} 1' in text
+        assert 'anki_queue_refills_total{collection="col1",queue="new"} 1' in text
+        assert 'anki_queue_depth{collection="col1",queue="lrn"} 0' in text
+
+        # a review card lapsing for the 8th time is a leech
+        c.type = c.queue = 2
+        c.ivl = 10
+        c.due = d.sched.today
+        c.factor = 2500
+        c.lapses = 7
+        d.sched.answerCard(c, 1)
+        assert c.queue == -1
+        assert 'anki_leeches_total{collection="col1"} 1' in metrics.exposition()
+
+        metrics.detach("col1")
+        assert "getCard" not in d.sched.__dict__
+        assert 'anki_queue_depth{collection="col1"' not in metrics.exposition()
+
+    def test_answerCards(self):
+        d = Collection()
+        for i in range(2):
+            d.addNote(Note())
+        metrics = Metrics()
+        metrics.attach(d.sched, "col1")
+        c1, c2 = d.cards
+        d.sched.answerCards([(c1, 3, schedv2.clock()), (c2, 3, schedv2.clock())])
+        assert 'anki_answers_total{collection="col1",ease="3"} 2' in metrics.exposition()
+        with self.assertRaises(ValueError):
+            metrics.attach(d.sched, "col1")
+
+        # the profiler does not remove the wrappers of the metrics
+        profiler = Profiler()
+        profiler.attach(d.sched)
+        profiler.detach(d.sched)
+        d.sched.answerCard(c1, 3)
+        assert 'anki_answers_total{collection="col1",ease="3"} 3' in metrics.exposition()
+        metrics.detach("col1")
+
+    def test_serve(self):
+        d = Collection()
+        metrics = Metrics()
+        metrics.attach(d.sched, "col1")
+        server = serve(metrics, port=0)
+        try:
+            host, port = server.server_address
+            with urlopen(f"http://{host}:{port}/metrics") as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                text = response.read().decode("utf-8")
+            assert 'anki_queue_depth{collection="col1",queue="rev"} 0' in text
+            with self.assertRaises(HTTPError):
+                urlopen(f"http://{host}:{port}/")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
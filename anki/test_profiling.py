@@ -0,0 +1,84 @@
+import json
+import time
+import unittest
+
+import schedv2
+from schedv2 import Collection, Note, Scheduler
+from profiling import Profiler
+from virtualclock import VirtualClock
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock(START).install(schedv2)
+
+    def tearDown(self):
+        self.clock.uninstall()
+
+    def test_attach(self):
+        d = Collection()
+        f = Note()
+        d.addNote(f)
+        profiler = Profiler()
+        profiler.attach(d.sched)
+        c = d.sched.getCard()
+        d.sched.answerCard(c, 3)
+        snapshot = profiler.snapshot()
+        assert snapshot["getCard"]["calls"] == 1
+        assert snapshot["answerCard"]["calls"] == 1
+        assert snapshot["_fillNew"]["calls"] >= 1
+        stats = snapshot["getCard"]
+        assert sum(stats["histogram"].values()) == 1
+        assert stats["maxNs"] == stats["totalNs"] < max(stats["histogram"])
+        # snapshots can be exported
+        json.dumps(snapshot)
+
+        # other schedulers are not profiled
+        assert "getCard" not in Scheduler(d).__dict__
+
+        profiler.detach(d.sched)
+        assert "getCard" not in d.sched.__dict__
+        d.sched.getCard()
+        assert profiler.snapshot(reset=True)["getCard"]["calls"] == 1
+        assert profiler.snapshot()["getCard"]["calls"] == 0
+
+
+    def test_answerCards(self):
+        d = Collection()
+        f = Note()
+        d.addNote(f)
+        profiler = Profiler()
+        profiler.attach(d.sched)
+        c = d.cards[0]
+        d.sched.answerCards([(c, 3, schedv2.clock())])
+        snapshot = profiler.snapshot()
+        assert snapshot["answerCards"]["calls"] == 1
+        assert snapshot["_answerCard"]["calls"] == 1
+        # the scheduler is profiled once
+        with self.assertRaises(ValueError):
+            profiler.attach(d.sched)
+        profiler.detach(d.sched)
+
+    def test_stackedWrappers(self):
+        d = Collection()
+        first, second = Profiler(), Profiler()
+        first.attach(d.sched)
+        second.attach(d.sched)
+        d.sched.getCard()
+        assert first.snapshot()["getCard"]["calls"] == 1
+        assert second.snapshot()["getCard"]["calls"] == 1
+        # detaching one profiler keeps the other
+        first.detach(d.sched)
+        d.sched.getCard()
+        assert first.snapshot()["getCard"]["calls"] == 1
+        assert second.snapshot()["getCard"]["calls"] == 2
+        second.detach(d.sched)
+        assert "getCard" not in d.sched.__dict__
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,15 @@
-import time
 import copy
+import time
 import unittest
 import copy
 from pprint import pprint
 
+import schedv2
 from schedv2 import Collection, Note, intTime, STARTING_FACTOR, deckDefaultConf
+from virtualclock import VirtualClock
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
 
 # Tests are similar to Anki test suite.
 # They have been slightly adapted to remove unsupported features
@@ -20,6 +25,14 @@ def checkRevIvl(d, c, targetIvl):
 class TestScheduler(unittest.TestCase):
 
 
+    def setUp(self):
+        self.clock = VirtualClock(START).install(schedv2)
+
+
+    def tearDown(self):
+        self.clock.uninstall()
+
+
     def test_basics(self):
         d = Collection()
         assert not d.sched.getCard()
@@ -44,7 +57,6 @@ class TestScheduler(unittest.TestCase):
         assert c.due >= t
 
 
-    @unittest.skip("slow test")
     def test_newLimits(self):
         d = Collection()
         # Lower the new cards per day limit
@@ -85,19 +97,19 @@ class TestScheduler(unittest.TestCase):
         assert c.left%1000 == 3
         assert c.left//1000 == 3
         # it should by due in 30 seconds
-        t = round(c.due - time.time())
+        t = round(c.due - self.clock.time())
         assert t >= 25 and t <= 40
         # pass it once
         d.sched.answerCard(c, 3)
         # it should by due in 3 minutes
-        dueIn = c.due - time.time()
+        dueIn = c.due - self.clock.time()
         assert 179 <= dueIn <= 180*1.25
         assert c.left%1000 == 2
         assert c.left//1000 == 2
         # pass again
         d.sched.answerCard(c, 3)
         # it should by due in 10 minutes
-        dueIn = c.due - time.time()
+        dueIn = c.due - self.clock.time()
         assert 599 <= dueIn <= 600*1.25
         assert c.left%1000 == 1
         assert c.left//1000 == 1
@@ -254,5 +266,239 @@ class TestScheduler(unittest.TestCase):
         assert c.ivl == 1
 
 
+    def test_preview(self):
+        d = Collection()
+        f = Note()
+        f['Front'] = "one"
+        d.addNote(f)
+        c = d.cards[0]
+        # new card: previewing must not start the learning steps
+        assert d.sched.preview(c) == (60, 330, 600, 4*86400)
+        assert c.left == 0
+        # same values as nextIvl for each button
+        c = d.sched.getCard()
+        d.sched.answerCard(c, 3)
+        assert d.sched.preview(c) == tuple(d.sched.nextIvl(c, ease) for ease in range(1, 5))
+        # review card, due 8 days ago
+        c.type = c.queue = 2
+        c.due = d.sched.today - 8
+        c.ivl = 100
+        c.factor = STARTING_FACTOR
+        ivls = d.sched.preview(c)
+        assert ivls == (600, 120*86400, 260*86400, 351*86400)
+        assert ivls == tuple(d.sched.nextIvl(c, ease) for ease in range(1, 5))
+        # batched variant
+        assert d.sched.previewCards([c, c]) == [ivls, ivls]
+
+
+    def test_answerCards(self):
+        d = Collection()
+        f = Note()
+        f['Front'] = "one"
+        d.addNote(f)
+        f = Note()
+        f['Front'] = "two"
+        d.addNote(f)
+        c1, c2 = d.cards
+        c2.type = c2.queue = 2
+        c2.due = d.sched.today - 8
+        c2.ivl = 100
+        c2.factor = STARTING_FACTOR
+        # the new card is answered twice an hour ago,
+        # the review card was answered yesterday
+        t = intTime()
+        d.sched.answerCards([
+            (c1, 1, t - 3600),
+            (c1, 3, t - 3600 + 60),
+            (c2, 3, t - 86400),
+        ])
+        assert c1.queue == 1 and c1.reps == 2
+        assert c1.left % 1000 == 1
+        dueIn = c1.due - (t - 3600 + 60)
+        assert 599 <= dueIn <= 600*1.25
+        assert c2.reps == 1
+        # (100 + 7//2) * 2.5 = 257
+        assert checkRevIvl(d, c2, 257)
+        assert c2.due == d.sched.today - 1 + c2.ivl
+        # the scheduler is back to the current day
+        assert d.sched.today == d.sched._daysSinceCreation()
+        # a generator is applied like a list
+        d.sched.answerCards((c, 3, t) for c in [c1, c2])
+        assert c1.reps == 3 and c2.reps == 2
+        # an invalid answer is rejected, the previous ones are kept
+        with self.assertRaises(ValueError):
+            d.sched.answerCards([(c1, 3, t), (c2, 5, t)])
+        assert c1.reps == 4 and c2.reps == 2
+
+
+    def test_answerCardsLeech(self):
+        d = Collection()
+        d.addNote(Note())
+        c = d.cards[0]
+        c.type = c.queue = 2
+        c.due = d.sched.today
+        c.ivl = 100
+        c.factor = STARTING_FACTOR
+        c.lapses = 7
+        t = intTime()
+        # the first answer suspends the card as a leech
+        with self.assertRaises(ValueError):
+            d.sched.answerCards([(c, 1, t), (c, 3, t + 60)])
+        assert c.queue == -1
+        assert c.reps == 1 and c.lapses == 8
+        # the queues were rebuilt
+        assert d.sched.getCard() is None
+
+
+    def test_changesSince(self):
+        d = Collection()
+        for i in range(3):
+            f = Note()
+            f['Front'] = str(i)
+            d.addNote(f)
+        c1, c2, c3 = d.cards
+        assert d.changesSince(0) == [c1, c2, c3]
+        # checkpoint
+        usn = d.usn
+        assert d.changesSince(usn) == []
+        d.sched.answerCard(c2, 3)
+        d.sched.answerCard(c1, 1)
+        assert d.changesSince(usn) == [c2, c1]
+        # a card modified again is only returned once
+        d.sched.answerCard(c2, 3)
+        assert d.changesSince(usn) == [c1, c2]
+        assert d.changesSince(c1.usn) == [c2]
+
+
+    def test_reviewOrder(self):
+        d = Collection()
+        # review cards (days late, interval)
+        for late, ivl in [(1, 100), (10, 10), (5, 100), (3, 2), (0, 1)]:
+            f = Note()
+            d.addNote(f)
+            c = d.cards[-1]
+            c.type = c.queue = 2
+            c.due = d.sched.today - late
+            c.ivl = ivl
+            c.factor = STARTING_FACTOR
+        # only the cards due the earliest are kept
+        d.sched.queueLimit = 3
+        d.sched.reset()
+        cards = [d.sched.getCard() for i in range(3)]
+        assert sorted(d.sched.today - c.due for c in cards) == [3, 5, 10]
+        # the most overdue relative to their interval first
+        deckConf = copy.deepcopy(deckDefaultConf)
+        deckConf['rev']['order'] = schedv2.REV_CARDS_OVERDUE
+        d.deckConf = deckConf
+        d.sched.queueLimit = 50
+        d.sched.reset()
+        cards = [d.sched.getCard() for i in range(5)]
+        assert [(d.sched.today - c.due, c.ivl) for c in cards] == [
+            (3, 2), (10, 10), (5, 100), (1, 100), (0, 1)]
+
+
+    def test_loadBalance(self):
+        d = Collection()
+        deckConf = copy.deepcopy(deckDefaultConf)
+        deckConf['rev']['loadBalance'] = True
+        d.deckConf = deckConf
+        # a review card due today, with a fuzz range of 238..262 days for "Good"
+        f = Note()
+        d.addNote(f)
+        c = d.cards[0]
+        c.type = c.queue = 2
+        c.due = d.sched.today
+        c.ivl = 100
+        c.factor = STARTING_FACTOR
+        # other reviews each day of the range except in 250 days
+        for ivl in range(238, 263):
+            if ivl == 250:
+                continue
+            f = Note()
+            d.addNote(f)
+            other = d.cards[-1]
+            other.type = other.queue = 2
+            other.due = d.sched.today + ivl
+            other.ivl = ivl
+            other.factor = STARTING_FACTOR
+        d.sched.reset()
+        d.sched.answerCard(c, 3)
+        assert c.ivl == 250
+        # the due counts are updated by the answers
+        counts = d.sched._dueLoad()
+        assert counts[d.sched.today] == 0
+        assert counts[d.sched.today + 250] == 1
+        d.sched.answerCard(c, 1)
+        assert counts[d.sched.today + 250] == 0
+
+
+    def test_fuzzOrder(self):
+        d = Collection()
+        for i in range(10):
+            f = Note()
+            d.addNote(f)
+        d2 = Collection()
+        d2.cards = copy.deepcopy(d.cards)
+        # the fuzz does not depend on the order of the answers
+        for c in d.cards:
+            d.sched.answerCard(c, 4)
+        for c in reversed(d2.cards):
+            d2.sched.answerCard(c, 4)
+        for c, c2 in zip(d.cards, d2.cards):
+            assert 3 <= c.ivl <= 5
+            assert c.ivl == c2.ivl
+        # but changes with the cards
+        assert len({c.ivl for c in d.cards}) > 1
+
+
+    def test_changeDeckConf(self):
+        d = Collection()
+        for i in range(3):
+            f = Note()
+            d.addNote(f)
+        review, relearning, new = d.cards
+        # a review card last reviewed 10 days ago
+        review.type = review.queue = 2
+        review.ivl = 100
+        review.due = d.sched.today + 90
+        review.factor = STARTING_FACTOR
+        # a lapsed card in relearning
+        relearning.type = 3
+        relearning.queue = 1
+        relearning.ivl = 1
+        relearning.due = intTime() + 600
+        # no change
+        assert d.sched.changeDeckConf(copy.deepcopy(d.deckConf)) == 0
+        # shorter intervals
+        deckConf = copy.deepcopy(d.deckConf)
+        deckConf['rev']['ivlFct'] = 0.5
+        deckConf['lapse']['minInt'] = 3
+        assert d.sched.changeDeckConf(deckConf) == 2
+        assert d.deckConf is deckConf
+        assert review.ivl == 50
+        assert review.due == d.sched.today + 40
+        assert relearning.ivl == 3
+        assert new.ivl == 0 and new.due == new.id
+        # capped intervals, the card is now overdue
+        deckConf = copy.deepcopy(d.deckConf)
+        deckConf['rev']['maxIvl'] = 5
+        assert d.sched.changeDeckConf(deckConf) == 1
+        assert review.ivl == 5
+        assert review.due == d.sched.today - 5
+        assert relearning.ivl == 3
+        d.sched._fillRev()
+        assert d.sched._revQueue == [review]
+        # the changes can't be found in a configuration edited in place
+        deckConf = d.deckConf
+        deckConf['rev']['maxIvl'] = 2
+        with self.assertRaises(ValueError):
+            d.sched.changeDeckConf(deckConf)
+        with self.assertRaises(ValueError):
+            d.sched.changeDeckConf(dict(deckConf))
+        assert review.ivl == 5
+        # the collections don't share the default configuration
+        assert Collection().deckConf['rev']['maxIvl'] == deckDefaultConf['rev']['maxIvl'] == 36500
+
+
 if __name__ == '__main__':
     unittest.main()
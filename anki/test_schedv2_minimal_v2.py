@@ -1,9 +1,14 @@
-import time
 import copy
+import time
 import unittest
 import copy
 
+import schedv2_minimal_v2
 from schedv2_minimal_v2 import Collection, Note, intTime, STARTING_FACTOR, deckDefaultConf
+from virtualclock import VirtualClock
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
 
 
 def checkRevIvl(d, c, targetIvl):
@@ -15,6 +20,14 @@ def checkRevIvl(d, c, targetIvl):
 class TestScheduler(unittest.TestCase):
 
 
+    def setUp(self):
+        self.clock = VirtualClock(START).install(schedv2_minimal_v2)
+
+
+    def tearDown(self):
+        self.clock.uninstall()
+
+
     def test_basics(self):
         d = Collection()
         assert not d.sched.getCard()
@@ -38,7 +51,6 @@ class TestScheduler(unittest.TestCase):
         assert c.due >= t
 
 
-    # @unittest.skip("slow test")
     def test_newLimits(self):
         d = Collection()
         # Lower the new cards per day limit
@@ -76,19 +88,19 @@ class TestScheduler(unittest.TestCase):
         assert c.left%1000 == 3
         assert c.left//1000 == 3
         # it should by due in 30 seconds
-        t = round(c.due - time.time())
+        t = round(c.due - self.clock.time())
         assert t >= 25 and t <= 40
         # pass it once
         d.sched.answerCard(c, 3)
         # it should by due in 3 minutes
-        dueIn = c.due - time.time()
+        dueIn = c.due - self.clock.time()
         assert 179 <= dueIn <= 180*1.25
         assert c.left%1000 == 2
         assert c.left//1000 == 2
         # pass again
         d.sched.answerCard(c, 3)
         # it should by due in 10 minutes
-        dueIn = c.due - time.time()
+        dueIn = c.due - self.clock.time()
         assert 599 <= dueIn <= 600*1.25
         assert c.left%1000 == 1
         assert c.left//1000 == 1
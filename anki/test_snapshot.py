@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+import unittest
+
+import schedv2
+from schedv2 import Collection, Note
+import snapshot
+from virtualclock import VirtualClock
+
+# 2020-01-01 9:00 (local time), the start of the virtual clock
+START = int(time.mktime((2020, 1, 1, 9, 0, 0, 0, 0, -1)))
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock(START).install(schedv2)
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        self.clock.uninstall()
+        os.remove(self.path)
+
+    def test_saveAndLoad(self):
+        d = Collection()
+        for i in range(3):
+            f = Note()
+            f['Front'] = str(i)
+            f['Back'] = "é"
+            d.addNote(f)
+        c = d.sched.getCard()
+        d.sched.answerCard(c, 3)
+        d.cards[0].note.addTag("leech")
+        snapshot.save(d, self.path)
+        # the temporary file replaced the snapshot
+        assert not os.path.exists(self.path + ".tmp")
+
+        d2 = snapshot.load(self.path)
+        assert d2.crt == d.crt
+        assert d2.usn == d.usn
+        assert d2.deckConf == d.deckConf
+        assert len(d2.cards) == 3
+        for c1, c2 in zip(d.cards, d2.cards):
+            for key in ('id', 'crt', 'type', 'queue', 'ivl', 'due', 'factor',
+                        'reps', 'lapses', 'left', 'usn'):
+                assert getattr(c1, key) == getattr(c2, key)
+            assert c1.note.id == c2.note.id
+            assert c1.note.tags == c2.note.tags
+            assert c1.note['Front'] == c2.note['Front']
+            assert c2.note['Back'] == "é"
+        # the queues contain the restored cards
+        assert d2.sched.today == d.sched.today
+        assert d2.sched.reps == d.sched.reps
+        assert [c.id for c in d2.sched._newQueue] == [c.id for c in d.sched._newQueue]
+        assert all(c in d2.cards for c in d2.sched._newQueue)
+        # the restored scheduler continues where it stopped
+        assert d2.sched.getCard().id == d.sched.getCard().id
+
+    def test_changesSince(self):
+        d = Collection()
+        for i in range(3):
+            d.addNote(Note())
+        usn = d.usn
+        c1, c2, c3 = d.cards
+        d.sched.answerCard(c3, 3)
+        d.sched.answerCard(c1, 3)
+        snapshot.save(d, self.path)
+
+        d2 = snapshot.load(self.path)
+        # the changes made before the save are still returned, in the same order
+        assert [c.id for c in d2.changesSince(usn)] == [c.id for c in d.changesSince(usn)] == [c3.id, c1.id]
+        assert [c.id for c in d2.changesSince(0)] == [c.id for c in d.changesSince(0)] == [c2.id, c3.id, c1.id]
+        # and the next changes follow them
+        d2.sched.answerCard(d2.cards[1], 3)
+        assert [c.id for c in d2.changesSince(usn)] == [c3.id, c1.id, c2.id]
+
+
+if __name__ == '__main__':
+    unittest.main()
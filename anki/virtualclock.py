@@ -0,0 +1,53 @@
+"""
+A virtual clock for the scheduler modules.
+
+The scheduler modules (schedv2.py, schedv2_minimal_v*.py, schedv2_annotated.py)
+read the time with their `clock` function and get unique ids from their
+`idSource` function. A VirtualClock replaces both, so that the time only
+moves when asked and the ids are returned without waiting for the next
+millisecond:
+
+    clock = VirtualClock().install(schedv2)
+    col = schedv2.Collection()
+    ...
+    clock.advance(600)  # 10 minutes later
+    ...
+    clock.uninstall()
+"""
+import itertools
+import time
+
+
+class VirtualClock:
+
+    def __init__(self, now=None):
+        if now is None:
+            now = time.time()
+        self.now = now                              # The current time in seconds
+        self._ids = itertools.count(int(now * 1000))
+        self._installed = []                        # The (module, clock, idSource) to restore
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def newId(self):
+        "Return a unique integer identifier (not related to the current time)."
+        return next(self._ids)
+
+    def install(self, *modules):
+        "Use this clock in the scheduler MODULES. Return the clock."
+        for module in modules:
+            self._installed.append((module, module.clock, module.idSource))
+            module.clock = self.time
+            module.idSource = self.newId
+        return self
+
+    def uninstall(self):
+        "Restore the clocks replaced by install()."
+        while self._installed:
+            module, clock, idSource = self._installed.pop()
+            module.clock = clock
+            module.idSource = idSource
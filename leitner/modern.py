@@ -6,73 +6,181 @@ We use 3 boxes. Each box is reviewed at a different interval:
 * Box 1: every day
 * Box 2: every 2-3 days (ex: Tuesday & Friday)
 * Box 3: every week (ex: Sunday)
+
+To simulate millions of cards, the system can also be represented by the
+number of cards in each box (see `study_box_counts`).
+
+`LeitnerSystem` holds the boxes of a learner, with any number of boxes and
+any review calendar. There is no global state, so that many learners can be
+simulated at the same time.
 """
-from queue import Queue
+from collections import deque
+import math
 import random
 from datetime import datetime, timedelta
 
 A = 0
 B = 1
 C = 2
-SYSTEM = [
-    Queue(), # Box A
-    Queue(), # Box B
-    Queue(), # Box C
-]
 
 
-def add(card, i):
-    """Add a new card in the Leitner system."""
-    SYSTEM[i].put(card)
-
 def review(card):
     """Answer a single card."""
     return random.choice([True, True, True, False])
 
-def study_box(number):
-    """Review all cards in a box."""
-    cards_to_review = []
-    while not SYSTEM[number].empty():
-        cards_to_review.append(SYSTEM[number].get())
-
-    for card in cards_to_review:
-        answer = review(card)
-        new_number = None
-        if answer and number < C:
-            # Promote
-            new_number = number + 1
-        elif not answer and number > A:
-            # Demote
-            new_number = number - 1
-        else:
-            # Replace in the same box
-            new_number = number
-        add(card, new_number)
-
-def study(day):
+# The probability that review() returns True
+SUCCESS_RATE = 3 / 4
+
+# The boxes to study for each day of the week (Monday first)
+WEEKLY_CALENDAR = [
+    [A],    # Monday
+    [A, B], # Tuesday
+    [A],    # Wednesday
+    [A],    # Thursday
+    [A, B], # Friday
+    [A],    # Saturday
+    [A, C], # Sunday
+]
+
+def binomial(n, p, rng=random):
+    """Return the number of successes among N trials of probability P."""
+    if hasattr(rng, "binomialvariate"): # Python 3.12+
+        return rng.binomialvariate(n, p)
+    # Port of random.binomialvariate() from Python 3.12
+    if p <= 0.0 or p >= 1.0:
+        return 0 if p <= 0.0 else n
+    if n == 1:
+        return int(rng.random() < p)
+    if p > 0.5:
+        return n - binomial(n, 1.0 - p, rng)
+    if n * p < 10.0:
+        # Geometric method by Devroye, in O(np)
+        x = y = 0
+        c = math.log2(1.0 - p)
+        if not c:
+            return x
+        while True:
+            y += math.floor(math.log2(rng.random()) / c) + 1
+            if y > n:
+                return x
+            x += 1
+    # Transformed rejection with squeeze method by Wolfgang Hörmann
+    setup_complete = False
+    spq = math.sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    vr = 0.92 - 4.2 / b
+    while True:
+        u = rng.random() - 0.5
+        us = 0.5 - abs(u)
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        v = rng.random()
+        if us >= 0.07 and v <= vr:
+            return k
+        if not setup_complete:
+            alpha = (2.83 + 5.1 / b) * spq
+            lpq = math.log(p / (1.0 - p))
+            m = math.floor((n + 1) * p)
+            h = math.lgamma(m + 1) + math.lgamma(n - m + 1)
+            setup_complete = True
+        v *= alpha / (a / (us * us) + b)
+        if math.log(v) <= h - math.lgamma(k + 1) - math.lgamma(n - k + 1) + (k - m) * lpq:
+            return k
+
+def study_box_counts(counts, number, rng=random):
+    """Review all cards in a box when COUNTS holds the number of cards per box.
+
+    Cards are answered independently with the same probability as in
+    review(), so the number of promoted cards follows a binomial
+    distribution, and the boxes end up with the same distribution of
+    cards as with LeitnerSystem.study_box().
+    """
+    total = counts[number]
+    promoted = binomial(total, SUCCESS_RATE, rng)
+    demoted = total - promoted
+    counts[number] = 0
+    if number < len(counts) - 1:
+        counts[number + 1] += promoted
+    else:
+        counts[number] += promoted
+    if number > A:
+        counts[number - 1] += demoted
+    else:
+        counts[number] += demoted
+
+def study(day, study_box):
     """Study the box according the week day."""
-    weekday = day.weekday()
-    if weekday == 0: # Monday
-        study_box(A)
-    elif weekday == 1: # Tuesday
-        study_box(A)
-        study_box(B)
-    elif weekday == 2: # Wednesday
-        study_box(A)
-    elif weekday == 3: # Thursday
-        study_box(A)
-    elif weekday == 4: # Friday
-        study_box(A)
-        study_box(B)
-    elif weekday == 5: # Saturday
-        study_box(A)
-    elif weekday == 6: # Sunday
-        study_box(A)
-        study_box(C)
-
-
-def print_box():
-    s1, s2, s3 = SYSTEM[A].qsize(), SYSTEM[B].qsize(), SYSTEM[C].qsize()
+    for number in WEEKLY_CALENDAR[day.weekday()]:
+        study_box(number)
+
+
+def compile_calendar(cycle, schedule):
+    """Return the boxes to study for each day of a review cycle.
+
+    SCHEDULE lists for each box the days of the cycle when the box is
+    studied. Ex: compile_calendar(7, [range(7), [1, 4], [6]]) == WEEKLY_CALENDAR
+    """
+    calendar = [[] for day in range(cycle)]
+    for number, days in enumerate(schedule):
+        for day in days:
+            calendar[day].append(number)
+    return calendar
+
+
+class LeitnerSystem:
+    """A Leitner system with any number of boxes.
+
+    The calendar is a list with the boxes to study for each day of the
+    review cycle (see compile_calendar). When studying a box, the cards are
+    first sorted in two lists, promoted and demoted, which are then moved
+    at once to the next and previous boxes.
+    """
+
+    def __init__(self, calendar=WEEKLY_CALENDAR, review=review):
+        self.calendar = [tuple(numbers) for numbers in calendar]
+        self.review = review
+        count = max(number for numbers in self.calendar for number in numbers) + 1
+        self.boxes = [deque() for number in range(count)]
+
+    def add(self, card, i=0):
+        """Add a new card in the Leitner system."""
+        self.boxes[i].append(card)
+
+    def study_box(self, number):
+        """Review all cards in a box."""
+        cards = self.boxes[number]
+        self.boxes[number] = deque()
+
+        promoted, demoted = [], []
+        for card in cards:
+            if self.review(card):
+                promoted.append(card)
+            else:
+                demoted.append(card)
+
+        self.boxes[min(number + 1, len(self.boxes) - 1)].extend(promoted)
+        self.boxes[max(number - 1, 0)].extend(demoted)
+
+    def study(self, day):
+        """Study the boxes planned for DAY.
+
+        DAY is either the number of the day since the start of the
+        simulation or a date (in which case a weekly calendar starts on
+        Mondays)."""
+        if hasattr(day, "toordinal"):
+            day = day.weekday()
+        for number in self.calendar[day % len(self.calendar)]:
+            self.study_box(number)
+
+    def sizes(self):
+        return [len(box) for box in self.boxes]
+
+
+def print_box(counts):
+    s1, s2, s3 = counts
     print()
     print(f"  +-----+    +-----+    +-----+")
     print(f"  |\\ {s1:3} \\   |\\ {s2:3} \\   |\\ {s3:3} \\")
@@ -85,17 +193,38 @@ def print_box():
 if __name__ == "__main__":
 
     # Populate the box
+    system = LeitnerSystem()
     for i in range(140):
-        add("New Card", 0)
+        system.add("New Card")
 
         # Print study progression
         if i % 10 == 0:
-            print_box()
+            print_box(system.sizes())
 
     # Study (over 10 days)
     for i in range(10):
         day = datetime.today() - timedelta(days=10 - i)
-        study(day)
+        system.study(day)
         print("\n-----------------------------------\n")
-        print_box()
+        print_box(system.sizes())
+
+    # Same using only the number of cards in each box
+    counts = [140, 0, 0]
+    for i in range(10):
+        day = datetime.today() - timedelta(days=10 - i)
+        study(day, lambda number: study_box_counts(counts, number))
+    print("\n-----------------------------------\n")
+    print_box(counts)
+
+    # Compare the number of cards in the last box after 1000 weeks
+    # with 3, 4, and 5 boxes
+    for size in range(3, 6):
+        # Box n is studied every 2^n days
+        schedule = [range(0, 2 ** (size - 1), 2 ** n) for n in range(size)]
+        system = LeitnerSystem(compile_calendar(2 ** (size - 1), schedule))
+        for i in range(140):
+            system.add("New Card")
+        for day in range(7000):
+            system.study(day)
+        print(f"{size} boxes: {system.sizes()}")
 
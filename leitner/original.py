@@ -4,55 +4,85 @@ Original version of the Leitner System.
 We use a large physical wooden box with 5 partitions with increasing sizes (1, 2, 5, 8, and 14 cm).
 The student could only review cards in a partition once it was full, moving them
 in the previous or next partition based on the answer.
+
+`WoodenBox` holds the partitions of a learner. There is no global state, so
+that many learners can be simulated at the same time.
 """
-from queue import Queue
+from collections import deque
 import random
 
 CARDS_PER_CM = 5
-
-BOX = [
-    Queue(1 * CARDS_PER_CM),
-    Queue(2 * CARDS_PER_CM),
-    Queue(5 * CARDS_PER_CM),
-    Queue(8 * CARDS_PER_CM),
-    Queue(14 * CARDS_PER_CM),
-]
-
-def add(card, i):
-    BOX[i].put(card)
-    if BOX[i].full():
-        study()
+PARTITION_SIZES = [1, 2, 5, 8, 14] # in cm
 
 def review(card):
     return random.choice([True, True, True, False])
 
 
-def study():
-    for index, partition in enumerate(BOX):
-        if partition.full():
+def next_partition(index, answer, count):
+    """Return the partition of a card reviewed in the partition INDEX."""
+    if answer and index + 1 < count:
+        # Promote
+        return index + 1
+    elif not answer and index - 1 > 0:
+        # Demote
+        return 0 # MN: The Leitner original System moves to the first partition
+    else:
+        # Replace in the same partition
+        return index
+
+
+class WoodenBox:
+    """The partitions of the box.
+
+    When a partition becomes full, its cards are pushed on a worklist and
+    the partition is emptied. Cards are then taken from the last pushed
+    partition, so that a partition filled while replacing the cards of
+    another one is studied first.
+    """
+
+    def __init__(self, sizes=PARTITION_SIZES, cards_per_cm=CARDS_PER_CM, review=review):
+        self.capacities = [size * cards_per_cm for size in sizes]
+        self.partitions = [deque() for size in sizes]
+        self.review = review
+        self.studies = 0 # The number of times a partition was studied
+        self.worklist = [] # The (index, cards) of the full partitions being studied
+
+    def add(self, card, i=0):
+        """Add a card and study the partitions that become full."""
+        self.put(card, i)
+        while True:
+            studied = self.next_card()
+            if studied is None:
+                break
+            index, card = studied
+            answer = self.review(card)
+            self.put(card, next_partition(index, answer, len(self.partitions)))
+
+    def put(self, card, i):
+        """Add a card in the partition I without studying it."""
+        partition = self.partitions[i]
+        partition.append(card)
+        if len(partition) >= self.capacities[i]:
             # Time to review the cards
-            print(f"Time to study partition {index + 1}!")
-
-            cards_to_review = []
-            while not partition.empty():
-                cards_to_review.append(partition.get())
-
-            for card in cards_to_review:
-                answer = review(card)
-                new_index = None
-                if answer and index + 1 < len(BOX):
-                    # Promote
-                    new_index = index + 1
-                elif not answer and index - 1 > 0:
-                    # Demote
-                    new_index = 0 # MN: The Leitner original System moves to the first partition
-                else:
-                    # Replace in the same partition
-                    new_index = index
-                add(card, new_index)
-
-def print_box():
-    s1, s2, s3, s4, s5 = BOX[0].qsize(), BOX[1].qsize(), BOX[2].qsize(), BOX[3].qsize(), BOX[4].qsize()
+            self.partitions[i] = deque()
+            self.studies += 1
+            self.worklist.append((i, partition))
+
+    def next_card(self):
+        """Return the (index, card) of the next card to study, or None."""
+        worklist = self.worklist
+        while worklist:
+            index, cards = worklist[-1]
+            if cards:
+                return index, cards.popleft()
+            worklist.pop()
+        return None
+
+    def sizes(self):
+        return [len(partition) for partition in self.partitions]
+
+def print_box(box):
+    s1, s2, s3, s4, s5 = box.sizes()
     print(f"  +-----+-------+----------+-------------+------------------+")
     print(f"  |\\ {s1:3} \\   {s2:3} \\      {s3:3} \\         {s4:3} \\              {s5:3} \\")
     print(f"  | +-----+-------+----------+-------------+------------------+")
@@ -63,13 +93,21 @@ def print_box():
 if __name__ == "__main__":
 
     # Populate the box
+    box = WoodenBox()
     for i in range(140):
-        add("New Card", 0)
+        box.add("New Card")
 
         if i % 10 == 0:
-            print_box()
-
-    # Study
-    study()
-    print_box()
+            print_box(box)
+    print(f"{box.studies} partitions studied")
+    print_box(box)
+
+    # Same with tens of thousands of cards using larger partitions
+    # (the box must not be filled up to its capacity or cards would be
+    # studied forever)
+    for cards_per_cm in [5, 50, 500, 1000]:
+        box = WoodenBox(cards_per_cm=cards_per_cm)
+        for i in range(int(sum(box.capacities) * 0.8)):
+            box.add("New Card")
+        print(f"{cards_per_cm:>4} cards/cm: {box.studies:>4} studies, {box.sizes()}")
 
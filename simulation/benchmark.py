@@ -0,0 +1,130 @@
+"""
+Compare the cost and the workload of the schedulers.
+
+Each algorithm studies the same deck with the same learner (see
+ForgettingLearner in learner.py). New cards are introduced during the first
+days, and the simulation continues until DAYS. We measure:
+
+* the mean number of reviews per day,
+* the number of reviews until the learner remembers RETENTION_TARGET of the
+  deck (measured every CHECKPOINT days),
+* the wall time and the peak memory.
+
+The schedulers are driven by the loop of harness.py through the adapters of
+schedulers.py. Each run is executed in a new process to measure its peak
+memory.
+
+Anki studies the cards with getCard(), whose queues are refilled by scanning
+the whole collection (see anki/schedv2.py): its time grows with the square
+of the number of cards. The algorithms are only run up to their MAX_SIZES
+(10k cards for Anki, about 3 minutes).
+
+    $ python3 benchmark.py                # 1k, 10k, and 100k cards
+    $ python3 benchmark.py 1000 10000 100000 1000000
+    $ python3 benchmark.py --profile SM-2 10000
+"""
+import os
+import random
+import resource
+import sys
+
+# The algorithms are standalone scripts in sibling directories
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("leitner", "supermemo", "anki"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+import original
+import harness
+import schedulers
+from learner import ForgettingLearner
+
+DAYS = 90
+NEW_DAYS = 10            # New cards are introduced during the first 10 days
+RETENTION_TARGET = 0.8
+CHECKPOINT = 7
+
+
+def new_per_day(size):
+    return -(-size // NEW_DAYS)
+
+
+def leitner_original(size):
+    # The last partition can contain all cards. The cards reaching it are
+    # known and are never studied again.
+    return schedulers.LeitnerOriginal(-(-size // original.PARTITION_SIZES[-1]))
+
+
+def anki(size):
+    # Anki warns when the review limit is lower than 10 times the new
+    # cards limit, as the reviews would pile up
+    return schedulers.AnkiV2(new_per_day(size), 10 * new_per_day(size))
+
+
+ALGORITHMS = {
+    "Leitner (original)": leitner_original,
+    "Leitner (modern)": lambda size: schedulers.LeitnerModern(),
+    "SM-0": lambda size: schedulers.SM0(),
+    "SM-2": lambda size: schedulers.SM2(),
+    "Anki (schedv2)": anki,
+}
+
+# The largest deck simulated in a practical time, by algorithm
+MAX_SIZES = {
+    "Anki (schedv2)": 10000,
+}
+
+
+def run(name, size, days=DAYS, seed=0):
+    """Simulate the algorithm NAME on SIZE cards. Return the measures."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    random.seed(seed)  # For the schedulers using the global random generator
+    learner = ForgettingLearner(size, rng=random.Random(seed))
+    reviews_to_target = None
+
+    def observe(day, daily):
+        nonlocal reviews_to_target
+        if reviews_to_target is None and learner.retention(day) >= RETENTION_TARGET:
+            reviews_to_target = sum(daily)
+
+    daily, elapsed = harness.simulate(ALGORITHMS[name](size), learner, days,
+                                      size, new_per_day(size), observe, CHECKPOINT)
+    return {
+        "name": name,
+        "size": size,
+        "reviews": sum(daily),
+        "reviews_per_day": sum(daily) / days,
+        "reviews_to_target": reviews_to_target,
+        "retention": learner.retention(days),
+        "time": elapsed,
+        "memory": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024,  # MiB
+    }
+
+
+def print_results(results):
+    print(f"| {'Algorithm':<18} | {'Cards':>7} | {'Reviews/day':>11} | "
+          f"{'To {:.0%}'.format(RETENTION_TARGET):>9} | {'Retention':>9} | "
+          f"{'Time':>7} | {'us/review':>9} | {'Memory':>9} |")
+    for r in results:
+        to_target = r["reviews_to_target"] if r["reviews_to_target"] is not None else "-"
+        per_review = r["time"] / r["reviews"] * 1e6 if r["reviews"] else 0
+        print(f"| {r['name']:<18} | {r['size']:>7} | {r['reviews_per_day']:>11.0f} | "
+              f"{to_target:>9} | {r['retention']:>9.1%} | "
+              f"{r['time']:>6.1f}s | {per_review:>9.1f} | {r['memory']:>5.0f} MiB |")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--profile"]:
+        name, size = sys.argv[2], int(sys.argv[3])
+        learner = ForgettingLearner(size, rng=random.Random(0))
+        harness.profile(ALGORITHMS[name](size), learner, DAYS, size, new_per_day(size))
+        sys.exit()
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    # One run at a time for the timings, in a new process each time so that
+    # the peak memory is not inherited from the previous runs
+    tasks = [(name, size) for size in sizes for name in ALGORITHMS
+             if size <= MAX_SIZES.get(name, size)]
+    for name, limit in MAX_SIZES.items():
+        if max(sizes) > limit:
+            print(f"{name}: skipped above {limit} cards")
+    print_results(harness.run_pool(run, tasks, processes=1, isolate=True))
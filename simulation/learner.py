@@ -0,0 +1,73 @@
+"""
+Models of the answers of a learner, shared by the simulations.
+
+Each algorithm asks a different question to the learner:
+
+* Leitner: was the card recalled? (see leitner/modern.py review())
+* SM-0: was the question recalled after N repetitions? (see supermemo/sm0.py review_question())
+* SM-2: what is the grade between 0 and 5? (see supermemo/sm2.py grade())
+* Anki: which button is pressed, between 1 (Again) and 4 (Easy)?
+
+The models answer these questions with the interface the schedulers of
+schedulers.py expect: recall(item, day), grade(item, day) and ease(item, day).
+To compare the algorithms, ForgettingLearner answers from a memory model.
+"""
+import math
+import random
+
+
+class ForgettingLearner:
+    """A learner forgetting items along an exponential forgetting curve.
+
+    The probability to recall an item is exp(-t / S) where t is the number
+    of days since the last review and S the stability of the memory. The
+    stability is multiplied by GROWTH each time the item is recalled on a
+    later day, and is reset when the item is forgotten. Items are numbered
+    from 0 to SIZE - 1 and are unknown until their first review.
+    """
+
+    def __init__(self, size, stability=2.0, growth=3.0, rng=random):
+        self.initial_stability = stability
+        self.growth = growth
+        self.rng = rng
+        self.last = [None] * size         # The day of the last review of each item
+        self.stability = [stability] * size
+
+    def probability(self, item, day):
+        last = self.last[item]
+        if last is None:
+            return 0.0
+        return math.exp((last - day) / self.stability[item])
+
+    def recall(self, item, day):
+        p = self.probability(item, day)
+        recalled = self.rng.random() < p
+        if not recalled:
+            self.stability[item] = self.initial_stability
+        elif day > self.last[item]:
+            self.stability[item] *= self.growth
+        self.last[item] = day
+        return recalled
+
+    def grade(self, item, day):
+        """Return a SM-2 grade between 0 and 5."""
+        p = self.probability(item, day)
+        if not self.recall(item, day):
+            return 1
+        return 5 if p > 0.9 else 4 if p > 0.6 else 3
+
+    def ease(self, item, day):
+        """Return an Anki button between 1 (Again) and 4 (Easy)."""
+        p = self.probability(item, day)
+        if not self.recall(item, day):
+            return 1
+        return 4 if p > 0.9 else 3 if p > 0.5 else 2
+
+    def retention(self, day):
+        """Return the mean probability to recall all items on DAY."""
+        total = 0.0
+        for last, stability in zip(self.last, self.stability):
+            if last is not None:
+                total += math.exp((last - day) / stability)
+        return total / len(self.last)
+
@@ -0,0 +1,60 @@
+"""
+Simulate many independent learners in parallel.
+
+Each learner has its own scheduler and its own random generator, so the
+simulations share no state and can run in a pool of processes. We measure
+the throughput (learners simulated per second) with an increasing number of
+processes, up to the number of cores.
+
+    $ python3 scaling.py              # 64 learners of 1000 cards with SM-2
+    $ python3 scaling.py "Leitner (modern)" 256 200
+"""
+import os
+import random
+import sys
+import time
+
+import benchmark
+import harness
+from learner import ForgettingLearner
+
+
+def simulate_learner(name, size, seed, days=benchmark.DAYS):
+    """Return the number of reviews of a learner of SIZE cards."""
+    # For the schedulers using the global random generator, which is not
+    # shared between processes
+    random.seed(seed)
+    learner = ForgettingLearner(size, rng=random.Random(seed))
+    scheduler = benchmark.ALGORITHMS[name](size)
+    daily, elapsed = harness.simulate(scheduler, learner, days, size, benchmark.new_per_day(size))
+    return sum(daily)
+
+
+def process_counts(cores):
+    """Return 1, 2, 4, ... up to CORES."""
+    counts = []
+    n = 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    return counts + [cores]
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "SM-2"
+    learners = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    size = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    cores = os.cpu_count()
+    tasks = [(name, size, seed) for seed in range(learners)]
+
+    print(f"{name}: {learners} learners of {size} cards over {benchmark.DAYS} days, {cores} core(s)")
+    baseline = None
+    for processes in process_counts(cores):
+        start = time.perf_counter()
+        reviews = harness.run_pool(simulate_learner, tasks, processes)
+        elapsed = time.perf_counter() - start
+        throughput = learners / elapsed
+        if baseline is None:
+            baseline = throughput
+        print(f"{processes:>3} process(es): {elapsed:6.1f}s, {throughput:7.1f} learners/s, "
+              f"speedup x{throughput / baseline:.2f}, {sum(reviews) / elapsed:10.0f} reviews/s")
@@ -0,0 +1,309 @@
+"""
+A common interface to drive all schedulers from the same simulation loop.
+
+A scheduler exposes:
+
+* question: the name of the ForgettingLearner method answering its items
+  ("recall", "grade", or "ease"),
+* add(item, day): add a new item (an integer) on DAY,
+* due(day): return the items to answer now. The loop calls due() again
+  after answering them, until it returns no items, so that an item can be
+  repeated the same day (learning steps, SM-2 drills, SM-0 iterations, ...),
+* answer(item, grade, day): schedule the item according the answer.
+
+Days are the number of days since the start of the simulation. The
+adapters below wrap the implementations of the sibling directories, which
+must be present in sys.path (see benchmark.py).
+"""
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import modern
+import original
+import schedv2
+import sm0
+import sm2
+from virtualclock import VirtualClock
+
+
+class LeitnerOriginal:
+    """The wooden box, whose partitions are studied when they are full."""
+
+    question = "recall"
+
+    def __init__(self, cards_per_cm=original.CARDS_PER_CM, sizes=original.PARTITION_SIZES):
+        self.box = original.WoodenBox(sizes, cards_per_cm)
+        self._index = None  # The partition of the card being studied
+
+    def add(self, item, day):
+        self.box.put(item, 0)
+
+    def due(self, day):
+        # Cards are studied one by one, as putting a card can fill another
+        # partition, to study first
+        studied = self.box.next_card()
+        if studied is None:
+            return []
+        self._index, card = studied
+        return [card]
+
+    def answer(self, item, grade, day):
+        self.box.put(item, original.next_partition(self._index, grade, len(self.box.partitions)))
+
+
+class LeitnerModern:
+    """The boxes studied according a calendar (see LeitnerSystem)."""
+
+    question = "recall"
+
+    def __init__(self, calendar=modern.WEEKLY_CALENDAR):
+        self.system = modern.LeitnerSystem(calendar)
+        self._day = None
+        self._numbers = []  # The boxes left to study today
+        self._number = None # The box being studied
+        self._promoted, self._demoted = [], []
+
+    def add(self, item, day):
+        self.system.add(item)
+
+    def due(self, day):
+        boxes = self.system.boxes
+        if self._number is not None:
+            # Move the cards of the studied box at once
+            boxes[min(self._number + 1, len(boxes) - 1)].extend(self._promoted)
+            boxes[max(self._number - 1, 0)].extend(self._demoted)
+            self._number = None
+            self._promoted, self._demoted = [], []
+        if day != self._day:
+            self._day = day
+            calendar = self.system.calendar
+            self._numbers = list(calendar[day % len(calendar)])
+        # An empty box must not end the day before the next boxes
+        while self._numbers:
+            self._number = self._numbers.pop(0)
+            cards = boxes[self._number]
+            if cards:
+                boxes[self._number] = deque()
+                return cards
+        self._number = None
+        return []
+
+    def answer(self, item, grade, day):
+        (self._promoted if grade else self._demoted).append(item)
+
+
+class SM0:
+    """The pages of questions, reviewed according the table of intervals.
+
+    New items are grouped into pages, learned the day they are added. A
+    session is repeated until all questions are recalled, as Page.review().
+    """
+
+    question = "recall"
+
+    def __init__(self, page_size=10, start=None):
+        self.page_size = page_size
+        self.start = start or date.today()
+        self.databook = sm0.Databook()
+        self.pages = {}        # question => page
+        self._new = []         # The questions added today
+        self._day = None
+        self._sessions = {}    # page => scores of today's session
+        self._iteration = 0
+        self._failed = []
+
+    def add(self, item, day):
+        self._new.append(item)
+
+    def due(self, day):
+        if day != self._day:
+            self._day = day
+            self._sessions = {}
+            d = self.start + timedelta(days=day)
+            pages = self.databook.pages
+            numbers = list(self.databook.schedule_book.pages_on(d))
+            for i in range(0, len(self._new), self.page_size):
+                questions = self._new[i:i + self.page_size]
+                number, dates = self.databook.add_page(questions, [None] * len(questions), d)
+                for question in questions:
+                    self.pages[question] = pages[number]
+                numbers.append(number)
+            pages = [pages[number] for number in numbers]
+            self._new = []
+            for page in pages:
+                self._sessions[page] = {}
+                page.repetition_scores.append(self._sessions[page])
+                page.repetitions.append({"No": len(page.repetitions) + 1, "Dat": d, "U": 0})
+            self._iteration = 1
+            return [question for page in pages for question in page.questions]
+
+        self._iteration += 1
+        failed, self._failed = self._failed, []
+        return failed
+
+    def answer(self, item, grade, day):
+        if grade:
+            return
+        page = self.pages[item]
+        i = page.question_indexes[item]
+        scores = self._sessions[page]
+        scores[i] = scores.get(i, 0) + 1
+        if self._iteration == 1:
+            page.repetitions[-1]["U"] += 1
+        self._failed.append(item)
+
+
+class SM2:
+    """The items bucketed by next review date (see sm2.Scheduler).
+
+    As in the paper, the items graded below 4 are repeated the same day until
+    they score at least 4, without changing their interval.
+    """
+
+    question = "grade"
+
+    def __init__(self, start=None):
+        self.start = start or date.today()
+        self.scheduler = sm2.Scheduler()
+        self.items = {}       # question => item
+        self._day = None
+        self._date = None
+        self._drilling = False
+        self._drills = []
+
+    def add(self, item, day):
+        i = sm2.Item(item, None)
+        # New items are due the day they are added
+        i.next_review = self.start + timedelta(days=day)
+        self.items[item] = i
+        self.scheduler.add(i)
+
+    def due(self, day):
+        if day != self._day:
+            self._day = day
+            self._date = self.start + timedelta(days=day)
+            self._drilling = False
+            return [item.question for item in self.scheduler.due(self._date)]
+        self._drilling = True
+        drills, self._drills = self._drills, []
+        return drills
+
+    def answer(self, item, grade, day):
+        if not self._drilling:
+            self.scheduler.review(self.items[item], self._date, grade)
+        if grade < 4:
+            self._drills.append(item)
+
+
+class DailyLimitScheduler(schedv2.Scheduler):
+    """The scheduler of anki/schedv2.py with the daily limits of the deck.
+
+    In schedv2.py, new/perDay and rev/perDay only bound the size of each
+    refill of the queues. Like Anki, which counts the cards studied each day
+    in the deck, this scheduler stops serving new and review cards once the
+    limits of the day are reached.
+    """
+
+    def __init__(self, col):
+        self.newToday = 0  # The number of new cards answered today
+        self.revToday = 0  # The number of review cards answered today
+        super().__init__(col)
+
+    def _updateCutoff(self):
+        today = self.today
+        super()._updateCutoff()
+        if self.today != today:
+            self.newToday = self.revToday = 0
+
+    def _answerCard(self, card, ease):
+        if card.queue == 0:
+            self.newToday += 1
+        elif card.queue == 2:
+            self.revToday += 1
+        super()._answerCard(card, ease)
+
+    def _fillNew(self):
+        left = self.col.deckConf["new"]["perDay"] - self.newToday
+        if left <= 0 or not super()._fillNew():
+            self._newQueue = []
+            return False
+        # the queue is popped from the end
+        del self._newQueue[:-left]
+        return True
+
+    def _fillRev(self):
+        left = self.col.deckConf["rev"]["perDay"] - self.revToday
+        if left <= 0 or not super()._fillRev():
+            self._revQueue = []
+            return False
+        del self._revQueue[:-left]
+        return True
+
+
+class AnkiV2:
+    """The collection of anki/schedv2.py.
+
+    The cards are studied one by one with getCard() and answerCard(), on a
+    virtual clock (see anki/virtualclock.py) starting each simulated day at
+    9 AM, with the daily limits of the deck (see DailyLimitScheduler).
+    Answers take no time: the clock only moves to the next learning step
+    when no card is left to study now.
+
+    schedv2.py reads the time from its module-level clock. The virtual clock
+    is installed around each call and the previous clock restored after, under
+    a lock shared by all adapters: adapters used from several threads don't
+    see each other's time, but don't run in parallel either (see
+    harness.run_pool() to use processes).
+    """
+
+    # Serializes the calls of all adapters, as they replace the same clock
+    _clockLock = threading.Lock()
+
+    question = "ease"
+
+    def __init__(self, new_per_day=20, rev_per_day=200):
+        self.clock = VirtualClock()
+        with self._virtualTime():
+            self.col = schedv2.Collection()
+            self.col.deckConf["new"]["perDay"] = new_per_day
+            self.col.deckConf["rev"]["perDay"] = rev_per_day
+            self.col.sched = DailyLimitScheduler(self.col)
+        # The days start at midnight, whatever the time of the simulation
+        self.clock.now = self.col.crt
+        self.cards = {}       # item => card
+        self._day = None
+
+    @contextmanager
+    def _virtualTime(self):
+        with self._clockLock:
+            self.clock.install(schedv2)
+            try:
+                yield
+            finally:
+                self.clock.uninstall()
+
+    def add(self, item, day):
+        card = schedv2.Card(schedv2.Note(id=item + 1), id=item + 1)
+        self.cards[item] = card
+        self.col.cards.append(card)
+
+    def due(self, day):
+        col, sched, clock = self.col, self.col.sched, self.clock
+        with self._virtualTime():
+            if day != self._day:
+                self._day = day
+                clock.now = max(clock.now, col.crt + day * 86400 + 9 * 3600)
+            card = sched.getCard()
+            if card is None:
+                # wait for the next learning step of the day
+                steps = [c.due for c in col.cards if c.queue == 1 and c.due < sched.dayCutoff]
+                if steps:
+                    clock.now = max(clock.now, min(steps))
+                    card = sched.getCard()
+        return [card.id - 1] if card else []
+
+    def answer(self, item, grade, day):
+        with self._virtualTime():
+            self.col.sched.answerCard(self.cards[item], grade)
@@ -4,8 +4,8 @@ Basic implementation of SM-0 for educational purposes.
 See the original paper http://super-memory.com/articles/paper.htm
 """
 import random
+from bisect import bisect_left, insort
 from datetime import date, timedelta
-from queue import Queue
 
 TABLE_REPETITION_INTERVALS = [4] # First review after 4 days
 
@@ -16,45 +16,90 @@ for i in range(1, 15):
     next = int(prev * 1.7)
     TABLE_REPETITION_INTERVALS.append(next)
 
-DATABOOK = []
-SCHEDULE_BOOK = {}
+class ScheduleBook:
+    """The pages to review, by day.
+
+    Days are stored as ordinals (see date.toordinal()). The days with pages
+    are also kept sorted to find the pages of a range of days.
+    """
+
+    def __init__(self):
+        self.pages = {} # ordinal => page numbers
+        self.days = []  # sorted ordinals
+
+    def schedule(self, page, day):
+        """Plan the review of PAGE on DAY."""
+        ordinal = day.toordinal()
+        if ordinal not in self.pages:
+            self.pages[ordinal] = []
+            insort(self.days, ordinal)
+        self.pages[ordinal].append(page)
+
+    def schedule_series(self, page, start, intervals=TABLE_REPETITION_INTERVALS):
+        """Plan all reviews of PAGE according the table of repetition intervals."""
+        days = []
+        for interval in intervals:
+            day = start + timedelta(days=interval)
+            self.schedule(page, day)
+            days.append(day)
+        return days
+
+    def pages_on(self, day):
+        """Return the pages to review on DAY."""
+        return self.pages.get(day.toordinal(), [])
+
+    def pages_between(self, start, end):
+        """Return the (day, pages) to review from START included to END excluded."""
+        i = bisect_left(self.days, start.toordinal())
+        j = bisect_left(self.days, end.toordinal())
+        return [(date.fromordinal(ordinal), self.pages[ordinal]) for ordinal in self.days[i:j]]
+
 
 def review_question(question, repetitions):
     # Increase the chance of success with the increased number of repetitions
-    return random.choice([True] * repetitions * 5 + [False])
+    # (same as random.choice([True] * repetitions * 5 + [False]))
+    return random.randrange(repetitions * 5 + 1) < repetitions * 5
 
 class Page:
 
     def __init__(self, questions, answers):
         self.questions = questions
         self.answers = answers
+        self.question_indexes = {question: i for i, question in enumerate(questions)}
+        # The "Repetition scores" columns, added session after session.
+        # Each session only stores the number of wrong answers of the
+        # questions that were not recalled the first time.
         self.repetition_scores = []
-        [self.repetition_scores.append([0] * 100) for q in self.questions]
         self.repetitions = []
 
-    def review(self, day):
-        remaining_questions = Queue()
-        for question in self.questions:
-            remaining_questions.put(question)
-        repetition_score_index = len(self.repetitions)
+    def score(self, question, session):
+        """Return the number of wrong answers to QUESTION during SESSION."""
+        if session >= len(self.repetition_scores):
+            return 0
+        return self.repetition_scores[session].get(self.question_indexes[question], 0)
+
+    def review(self, day, review_question=review_question):
+        # Questions are referenced by their index
+        remaining_questions = list(range(len(self.questions)))
+        scores = {}
+        self.repetition_scores.append(scores)
 
         # Review until there is no more cards wrongly answered
         iteration = 1
         # Memorize the number of wrong answers during the first iteration
         U = 0
-        while not remaining_questions.empty():
+        while remaining_questions:
 
-            questions_to_review = []
-            while not remaining_questions.empty():
-                questions_to_review.append(remaining_questions.get())
+            questions_to_review = remaining_questions
+            remaining_questions = []
 
-            for question in questions_to_review:
-                if not review_question(question, iteration):
+            for i in questions_to_review:
+                if not review_question(self.questions[i], iteration):
                     # Review again
-                    remaining_questions.put(question)
+                    remaining_questions.append(i)
 
                     # Add a dot in the "Repetition scores" column for the given question and session
-                    self.repetition_scores[self.questions.index(question)][repetition_score_index] += 1
+                    scores[i] = scores.get(i, 0) + 1
 
                     # Save the U value for the U column
                     if iteration == 1:
@@ -76,49 +121,55 @@ class Page:
         print(f"+----------+----------+----+----+----+----+----+----------------------+")
         for i, question in enumerate(self.questions):
             answer = self.answers[i]
-            repetition_score1 = self.repetition_scores[i][0]
-            repetition_score2 = self.repetition_scores[i][1]
-            repetition_score3 = self.repetition_scores[i][2]
-            repetition_score4 = self.repetition_scores[i][3]
-            repetition_score5 = self.repetition_scores[i][4]
+            repetition_score1 = self.score(question, 0)
+            repetition_score2 = self.score(question, 1)
+            repetition_score3 = self.score(question, 2)
+            repetition_score4 = self.score(question, 3)
+            repetition_score5 = self.score(question, 4)
 
             repetition_number = i + 1
             repetition_date = ""
             repetition_U = ""
             if len(self.repetitions) > i:
-                repetition_date = self.repetitions[i]["Dat"]
+                repetition_date = str(self.repetitions[i]["Dat"])
                 repetition_U = self.repetitions[i]["U"]
 
             print(f"| {question:>8} | {answer:>8} | {repetition_score1:>2} | {repetition_score2:>2} | {repetition_score3:>2} | {repetition_score4:>2} | {repetition_score5:>2} | {repetition_number:>2} | {repetition_date:>10} | {repetition_U:>2} |")
             print(f"+----------+----------+------------------------+----------------------+")
 
 
+class Databook:
+    """The pages of a learner and the schedule of their reviews."""
+
+    def __init__(self):
+        self.pages = []
+        self.schedule_book = ScheduleBook()
+
+    def add_page(self, questions, answers, day):
+        """Add a new page and plan its reviews. Return the page number and the review dates."""
+        self.pages.append(Page(questions, answers))
+        page_number = len(self.pages) - 1
+        return page_number, self.schedule_book.schedule_series(page_number, day)
+
+
 if __name__ == "__main__":
-    # Add a new page
-    DATABOOK.append(Page(
-        questions=["Q1", "Q2", "Q3", "Q4", "Q5", "Q6", "Q7", "Q8", "Q9", "Q10"],
-        answers=["A1", "A2", "A3", "A4", "A5", "A6", "A7", "A8", "A9", "A10"],
-    ))
-    page_number = len(DATABOOK) - 1
+    databook = Databook()
 
-    # Mark the page to review according the table of repetition intervals
+    # Add a new page, marked to review according the table of repetition intervals
     now = date.today()
-    for interval in TABLE_REPETITION_INTERVALS:
-        review_date = str(now + timedelta(days=interval))
-        if review_date not in SCHEDULE_BOOK:
-            SCHEDULE_BOOK[review_date] = []
+    page_number, review_dates = databook.add_page(
+        questions=["Q1", "Q2", "Q3", "Q4", "Q5", "Q6", "Q7", "Q8", "Q9", "Q10"],
+        answers=["A1", "A2", "A3", "A4", "A5", "A6", "A7", "A8", "A9", "A10"],
+        day=now,
+    )
+    for review_date in review_dates:
         print(f"Page {page_number} to review on {review_date}")
-        SCHEDULE_BOOK[review_date] = [page_number]
-
-    # Review one year
-    for i in range(365):
-        day = str(now + timedelta(days=i))
-        if not day in SCHEDULE_BOOK:
-            # Nothing to review today
-            continue
+
+    # Review one year (only the days with pages to review)
+    for day, page_numbers in databook.schedule_book.pages_between(now, now + timedelta(days=365)):
         # Review each planned pages
-        for page in SCHEDULE_BOOK[day]:
-            print(f"Reviewing page {page} on {day}")
-            DATABOOK[page].review(day)
+        for page_number in page_numbers:
+            print(f"Reviewing page {page_number} on {day}")
+            databook.pages[page_number].review(day)
 
-    DATABOOK[0].print()
+    databook.pages[0].print()
@@ -3,14 +3,19 @@ Basic implementation of SM-2 for educational purposes.
 
 See the original paper http://super-memory.com/english/ol/sm2.htm
 """
+import json
 import random
 from datetime import date, timedelta
 from queue import Queue
 
+# Each grade q has a weight of (q + 1) * repetitions
+GRADES = [0, 1, 2, 3, 4, 5]
+GRADE_CUM_WEIGHTS = [1, 3, 6, 10, 15, 21]
+
 def grade(question, repetitions):
-    # Increase the chance of success with the increased number of repetitions
-    choices = [0] * 1 * repetitions + [1] * 2 * repetitions + [2] * 3 * repetitions + [3] * 4 * repetitions + [4] * 5 * repetitions + [5] * 6 * repetitions
-    return random.choice(choices)
+    # Same as picking one of [0] * 1 * repetitions + [1] * 2 * repetitions + ... + [5] * 6 * repetitions
+    # (the weights are all proportional to the repetitions so the probabilities do not change)
+    return random.choices(GRADES, cum_weights=GRADE_CUM_WEIGHTS)[0]
 
 # Settings
 I1 = 1
@@ -39,6 +44,63 @@ class Item:
         self.repetitions += 1
         return q < 4
 
+class Scheduler:
+    """Items bucketed by their next review date.
+
+    The items to review on a given day are found without scanning all
+    items, and review() moves the item to the bucket of its new date.
+    """
+
+    def __init__(self, items=()):
+        # Dicts are used as ordered sets to remove items in O(1)
+        self.buckets = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        self.buckets.setdefault(item.next_review, {})[item] = None
+
+    def due(self, day):
+        """Return the items to review on DAY."""
+        return list(self.buckets.get(day, ()))
+
+    def review(self, item, day, q):
+        """Same as Item.review() but keep the buckets up-to-date."""
+        bucket = self.buckets[item.next_review]
+        del bucket[item]
+        if not bucket:
+            del self.buckets[item.next_review]
+        result = item.review(day, q)
+        self.add(item)
+        return result
+
+    def save(self, path):
+        """Save the buckets in a JSON file."""
+        buckets = {}
+        for day, bucket in sorted(self.buckets.items()):
+            buckets[day.isoformat()] = [
+                [item.question, item.answer, item.EF, item.I, item.repetitions]
+                for item in bucket]
+        with open(path, "w") as f:
+            json.dump(buckets, f)
+
+    @classmethod
+    def load(cls, path):
+        """Restore the buckets saved in the JSON file at PATH."""
+        with open(path) as f:
+            buckets = json.load(f)
+        scheduler = cls()
+        for day, bucket in buckets.items():
+            next_review = date.fromisoformat(day)
+            for question, answer, EF, I, repetitions in bucket:
+                item = Item(question, answer)
+                item.EF = EF
+                item.I = I
+                item.next_review = next_review
+                item.repetitions = repetitions
+                scheduler.add(item)
+        return scheduler
+
 def print_items(items):
     print(f"+----------+----------+------+-------+-------------+")
     print(f"| Question | Answer   |  EF  | I     | Next Review |")
@@ -54,19 +116,18 @@ if __name__ == "__main__":
         items.append(Item(f"Q{i}", f"A{i}"))
 
     # Review one year
-    # for i in range(365):
+    scheduler = Scheduler(items)
     for i in range(365):
         day = date.today() + timedelta(days=i)
 
         items_to_review = Queue()
-        for item in items:
-            if item.next_review == day:
-                items_to_review.put(item)
+        for item in scheduler.due(day):
+            items_to_review.put(item)
 
         while not items_to_review.empty():
             item = items_to_review.get()
             q = grade(item.question, item.repetitions + 1)
-            if not item.review(day, q):
+            if not scheduler.review(item, day, q):
                 items_to_review.put(item)
 
     # Show results
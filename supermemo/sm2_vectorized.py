@@ -0,0 +1,105 @@
+"""
+SM-2 for millions of items using NumPy.
+
+Same algorithm as sm2.py but the state of the items (EF, I, next review,
+repetitions) is stored in arrays, and all items due the same day are
+reviewed at once. Results are identical to Item.review().
+
+    $ pip3 install numpy
+    $ python3 sm2_vectorized.py
+"""
+import time
+from datetime import date
+
+import numpy as np
+
+from sm2 import GRADES, GRADE_CUM_WEIGHTS, I1, I2, MIN_EF
+
+# Each grade repeated as many times as its weight in sm2.grade(), to pick
+# one uniformly
+GRADE_CHOICES = np.repeat(np.array(GRADES, dtype=np.int8), np.diff(GRADE_CUM_WEIGHTS, prepend=0))
+
+# The change of EF for each grade q, computed as in Item.review()
+EF_DELTAS = np.array([(0.1-(5-q)*(0.08+(5-q)*0.02)) for q in range(6)])
+
+
+class Items:
+
+    def __init__(self, count, today=None):
+        if today is None:
+            today = date.today()
+        self.EF = np.full(count, 2.5)
+        self.I = np.full(count, I1, dtype=np.int64)
+        # Dates are stored as ordinals (see date.toordinal())
+        self.next_review = np.full(count, today.toordinal() + I1, dtype=np.int64)
+        self.repetitions = np.zeros(count, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.EF)
+
+    def due(self, day):
+        """Return the indexes of the items to review on DAY (an ordinal)."""
+        return np.flatnonzero(self.next_review == day)
+
+    def review(self, indexes, day, q):
+        """Same as Item.review() for the items at INDEXES with the grades Q."""
+        EF, I = review(self.EF[indexes], self.I[indexes], q)
+        self.EF[indexes] = EF
+        self.I[indexes] = I
+        self.next_review[indexes] = day + I
+        self.repetitions[indexes] += 1
+        return q < 4
+
+
+def review(EF, I, q):
+    """Return the new EF and I of items after being graded Q."""
+    EF = np.maximum(EF + EF_DELTAS[q], MIN_EF)
+    # np.rint() rounds half to even like round()
+    next_I = np.rint(I * EF).astype(np.int64)
+    next_I[I == I1] = I2
+    next_I[q < 3] = I1
+    return EF, next_I
+
+
+def grade(rng, count):
+    """Same as sm2.grade() for COUNT items at once."""
+    return GRADE_CHOICES[rng.integers(0, len(GRADE_CHOICES), count, dtype=np.uint8)]
+
+
+def simulate(items, days, rng, today=None):
+    """Same as the main loop of sm2.py. Return the number of reviews."""
+    if today is None:
+        today = date.today()
+    reviews = 0
+    for i in range(days):
+        day = today.toordinal() + i
+        indexes = items.due(day)
+        # Work on copies of the due items, written back at the end of the day
+        q = grade(rng, len(indexes))
+        reviews += len(indexes)
+        EF, I = review(items.EF[indexes], items.I[indexes], q)
+        repetitions = items.repetitions[indexes] + 1
+        # Same as sm2.py, items are reviewed again when review() is False.
+        # PENDING contains their positions in the copies.
+        pending = np.flatnonzero(q >= 4)
+        while len(pending):
+            q = grade(rng, len(pending))
+            reviews += len(pending)
+            EF[pending], I[pending] = review(EF[pending], I[pending], q)
+            repetitions[pending] += 1
+            pending = pending[q >= 4]
+        items.EF[indexes] = EF
+        items.I[indexes] = I
+        items.next_review[indexes] = day + I
+        items.repetitions[indexes] = repetitions
+    return reviews
+
+
+if __name__ == "__main__":
+    for count in [100_000, 1_000_000, 10_000_000]:
+        items = Items(count)
+        start = time.perf_counter()
+        reviews = simulate(items, 365, np.random.default_rng(0))
+        elapsed = time.perf_counter() - start
+        print(f"{count:>10} items: {reviews:>11} reviews in {elapsed:.1f}s "
+              f"(mean EF {items.EF.mean():.2f}, mean I {items.I.mean():.0f})")